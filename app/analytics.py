@@ -0,0 +1,208 @@
+import argparse
+import json
+import re
+from datetime import date as Date
+
+import numpy as np
+
+from export import store_rows
+from retention import ARCHIVE_FILE
+from summary import format_time
+
+PERCENTILES = (50, 75, 90, 95)
+ROLLING_WEEKS = 4
+HOURS_PER_WEEK = 40
+
+
+class Dataset:
+    # The whole history as arrays: seconds per (day, category) over one contiguous range of
+    # days, plus one entry per session. Sessions are rebuilt from the stored pieces, which are
+    # clipped at midnight, by joining pieces of a category that touch.
+
+    def __init__(self, first_day, categories, matrix, session_categories, session_seconds):
+        self.first_day = first_day
+        self.categories = categories
+        self.matrix = matrix
+        self.session_categories = session_categories
+        self.session_seconds = session_seconds
+
+    @property
+    def days(self):
+        return self.first_day + np.arange(self.matrix.shape[0])
+
+    def day_index(self, day):
+        return int((np.datetime64(day, 'D') - self.first_day).astype(np.int64))
+
+
+def load_dataset(rows):
+    dates = []
+    category_ids = []
+    starts = []
+    ends = []
+    seconds = []
+    ids = {}
+    for date, category, start, end, value in rows:
+        if category not in ids:
+            ids[category] = len(ids)
+        dates.append(date)
+        category_ids.append(ids[category])
+        starts.append(np.nan if start is None else start)
+        ends.append(np.nan if end is None else end)
+        seconds.append(value)
+
+    categories = list(ids)
+    if not dates:
+        return Dataset(np.datetime64('today', 'D'), categories, np.zeros((0, 0)), np.zeros(0, np.int64),
+                       np.zeros(0))
+
+    days = np.array(dates, dtype='datetime64[D]')
+    category_ids = np.array(category_ids, dtype=np.int64)
+    seconds = np.array(seconds, dtype=np.float64)
+    first_day = days.min()
+    day_ids = (days - first_day).astype(np.int64)
+    shape = (int(day_ids.max()) + 1, len(categories))
+    matrix = np.bincount(day_ids * shape[1] + category_ids, weights=seconds,
+                         minlength=shape[0] * shape[1]).reshape(shape)
+
+    session_categories, session_seconds = join_sessions(category_ids, np.array(starts), np.array(ends))
+    return Dataset(first_day, categories, matrix, session_categories, session_seconds)
+
+
+def join_sessions(category_ids, starts, ends):
+    # Day totals from before intervals were recorded have no start and are not sessions.
+    timed = ~np.isnan(starts)
+    category_ids, starts, ends = category_ids[timed], starts[timed], ends[timed]
+    if not len(starts):
+        return np.zeros(0, np.int64), np.zeros(0)
+
+    order = np.lexsort((starts, category_ids))
+    category_ids, starts, ends = category_ids[order], starts[order], ends[order]
+    new_session = np.ones(len(starts), dtype=bool)
+    new_session[1:] = (category_ids[1:] != category_ids[:-1]) | (starts[1:] != ends[:-1])
+    session_ids = np.cumsum(new_session) - 1
+    return category_ids[new_session], np.bincount(session_ids, weights=ends - starts)
+
+
+def weekly_totals(dataset):
+    # Rows are ISO weeks (Monday first) that overlap the data; 1970-01-01 was a Thursday.
+    if not dataset.matrix.size:
+        return np.zeros(0, dtype='datetime64[D]'), np.zeros((0, len(dataset.categories)))
+    day_numbers = dataset.days.astype(np.int64)
+    weeks = (day_numbers + 3) // 7
+    boundaries = np.concatenate(([0], np.flatnonzero(np.diff(weeks)) + 1))
+    week_starts = (np.unique(weeks) * 7 - 3).astype('datetime64[D]')
+    return week_starts, np.add.reduceat(dataset.matrix, boundaries, axis=0)
+
+
+def weekly_averages(dataset):
+    _, weekly = weekly_totals(dataset)
+    if not len(weekly):
+        return {}
+    return dict(zip(dataset.categories, weekly.mean(axis=0).tolist()))
+
+
+def rolling_utilization(dataset, weeks=ROLLING_WEEKS, hours_per_week=HOURS_PER_WEEK):
+    # Booked time over the last `weeks` weeks as a fraction of the contracted hours.
+    week_starts, weekly = weekly_totals(dataset)
+    if len(weekly) < weeks:
+        return []
+    cumulative = np.concatenate(([0.0], np.cumsum(weekly.sum(axis=1))))
+    utilization = (cumulative[weeks:] - cumulative[:-weeks]) / (weeks * hours_per_week * 3600)
+    return list(zip(week_starts[weeks - 1:].astype(str).tolist(), utilization.tolist()))
+
+
+def session_percentiles(dataset, percentiles=PERCENTILES):
+    if not len(dataset.session_seconds):
+        return {}
+    result = {'': dict(zip(map(str, percentiles),
+                           np.percentile(dataset.session_seconds, percentiles).tolist()))}
+    for category_id, category in enumerate(dataset.categories):
+        lengths = dataset.session_seconds[dataset.session_categories == category_id]
+        if len(lengths):
+            result[category] = dict(zip(map(str, percentiles), np.percentile(lengths, percentiles).tolist()))
+    return result
+
+
+def quarter_range(quarter):
+    year, number = quarter.split('-Q')
+    first = Date(int(year), 3 * int(number) - 2, 1)
+    after = Date(int(year) + int(number) // 4, 3 * int(number) % 12 + 1, 1)
+    return first, after
+
+
+def last_quarter(dataset):
+    last = (dataset.first_day + max(dataset.matrix.shape[0] - 1, 0)).astype(object)
+    return f"{last.year}-Q{(last.month - 1) // 3 + 1}"
+
+
+def quarter_shares(dataset, quarter=None):
+    quarter = quarter or last_quarter(dataset)
+    first, after = quarter_range(quarter)
+    rows = dataset.matrix[max(0, dataset.day_index(first)):max(0, dataset.day_index(after))]
+    totals = rows.sum(axis=0)
+    total = totals.sum()
+    if not total:
+        return quarter, {}
+    return quarter, dict(zip(dataset.categories, (totals / total).tolist()))
+
+
+def valid_quarter(value):
+    if not re.fullmatch(r'\d{4}-Q[1-4]', value):
+        raise ValueError(value)
+    return value
+
+
+def analyse(rows, quarter=None, weeks=ROLLING_WEEKS, hours_per_week=HOURS_PER_WEEK):
+    dataset = load_dataset(rows)
+    quarter, shares = quarter_shares(dataset, quarter)
+    return {
+        'categories': dataset.categories,
+        'weekly_averages': weekly_averages(dataset),
+        'rolling_utilization': rolling_utilization(dataset, weeks, hours_per_week),
+        'session_percentiles': session_percentiles(dataset),
+        'quarter': quarter,
+        'quarter_shares': shares,
+    }
+
+
+def format_report(report):
+    lines = ["Gemiddelde per week", "-" * 50]
+    for category, seconds in sorted(report['weekly_averages'].items(), key=lambda item: -item[1]):
+        if seconds > 0:
+            lines.append(f"{category:<30}: {format_time(seconds)}")
+
+    lines += ["", f"Bezetting (voortschrijdend, {ROLLING_WEEKS} weken)", "-" * 50]
+    for week_start, utilization in report['rolling_utilization'][-8:]:
+        lines.append(f"week van {week_start:<20}: {utilization:>6.0%}")
+
+    lines += ["", "Sessieduur (p50 / p90)", "-" * 50]
+    for category, values in report['session_percentiles'].items():
+        lines.append(f"{category or 'Alle categorieën':<30}: {format_time(values['50'])} / {format_time(values['90'])}")
+
+    lines += ["", f"Aandeel in {report['quarter']}", "-" * 50]
+    for category, share in sorted(report['quarter_shares'].items(), key=lambda item: -item[1]):
+        if share > 0:
+            lines.append(f"{category:<30}: {share:>6.1%}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trendcijfers over de hele tijdregistratie.")
+    parser.add_argument('--storage', choices=('json', 'day-index', 'sqlite'), default=None)
+    parser.add_argument('--data-file')
+    parser.add_argument('--journal-file')
+    parser.add_argument('--archive-file')
+    parser.add_argument('--quarter', type=valid_quarter,
+                        help="kwartaal voor het aandeel per categorie (JJJJ-Qn), standaard het laatste")
+    parser.add_argument('--hours-per-week', type=float, default=HOURS_PER_WEEK)
+    parser.add_argument('--json', action='store_true', help="geef het resultaat als JSON")
+    args = parser.parse_args(argv)
+
+    report = analyse(store_rows(args.storage, args.data_file, args.journal_file, args.archive_file or ARCHIVE_FILE),
+                     args.quarter,
+                     hours_per_week=args.hours_per_week)
+    print(json.dumps(report, indent=4) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from categories import DEFAULT_CATEGORIES, CategoryRegistry
+from history import DATE_FORMAT, PERIODS, History
+from storage import BackgroundWriter, DayIndexStore, JournalStore, SqliteStore, write_atomic
+from summary import format_summary
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STORAGE_MODES = ('json', 'day-index', 'sqlite')
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+STARTUP_RUNS = 10
+WORKDAY_START = 8 * 3600
+WORKDAY_END = 18 * 3600
+
+
+def category_names(count):
+    names = list(DEFAULT_CATEGORIES[:count])
+    while len(names) < count:
+        names.append(f"Categorie {len(names) + 1}")
+    return names
+
+
+def generate_history(days, categories, sessions_per_day, seed=0, end=None):
+    # The same arguments always give the same history: sessions are drawn from a seeded
+    # generator and laid out back to back over a working day ending on `end`.
+    rng = random.Random(seed)
+    names = category_names(categories)
+    end = end or datetime.now().strftime(DATE_FORMAT)
+    last_day = datetime.strptime(end, DATE_FORMAT)
+
+    history = History()
+    for offset in range(days - 1, -1, -1):
+        day_start = (last_day - timedelta(days=offset)).timestamp()
+        cuts = sorted(rng.uniform(WORKDAY_START, WORKDAY_END) for _ in range(2 * sessions_per_day))
+        for start, stop in zip(cuts[::2], cuts[1::2]):
+            history.add_interval(rng.choice(names), day_start + start, day_start + stop)
+    return history, names
+
+
+def write_dataset(directory, days, categories, sessions_per_day, seed=0, end=None):
+    history, names = generate_history(days, categories, sessions_per_day, seed, end)
+    write_atomic(os.path.join(directory, 'data.json'), json.dumps(history.to_json()), fsync=False)
+    write_atomic(os.path.join(directory, 'categories.json'), json.dumps(names), fsync=False)
+    return history
+
+
+def make_store(mode, directory, writer=None):
+    data_file = os.path.join(directory, 'data.json')
+    journal_file = os.path.join(directory, 'journal.jsonl')
+    if mode == 'day-index':
+        return DayIndexStore(os.path.join(directory, 'days.jsonl'), journal_file, legacy_file=data_file,
+                             writer=writer)
+    if mode == 'sqlite':
+        return SqliteStore(os.path.join(directory, 'data.sqlite3'), legacy_file=data_file,
+                           journal_file=journal_file, writer=writer)
+    return JournalStore(data_file, journal_file, writer=writer)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_stats(timings):
+    timings = sorted(timings)
+    return {
+        'p50_ms': percentile(timings, 0.5),
+        'p90_ms': percentile(timings, 0.9),
+        'p99_ms': percentile(timings, 0.99),
+        'max_ms': timings[-1],
+        'mean_ms': sum(timings) / len(timings),
+    }
+
+
+def measure(func, repeat):
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Peak memory comes from a separate traced call: tracemalloc slows down every allocation.
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {**latency_stats(timings), 'peak_kb': peak / 1024}
+
+
+def startup_benchmark(mode, directory, runs):
+    # Launches main.py for real with TIME_TRACKER_STARTUP_REPORT set, from a copy of the
+    # directory layout it expects: data files one level above the working directory.
+    if importlib.util.find_spec('ttkbootstrap') is None:
+        return None, "ttkbootstrap is niet geïnstalleerd"
+    if sys.platform != 'win32' and not os.environ.get('DISPLAY'):
+        return None, "geen display (gebruik xvfb-run)"
+
+    app_dir = os.path.join(directory, 'app')
+    os.makedirs(os.path.join(app_dir, 'resources'), exist_ok=True)
+    shutil.copy(os.path.join(directory, 'data.json'), os.path.join(directory, 'time_registration_data.json'))
+    shutil.copy(os.path.join(directory, 'categories.json'), os.path.join(app_dir, 'resources', 'categories.json'))
+    env = dict(os.environ, TIME_TRACKER_STARTUP_REPORT='1', TIME_TRACKER_STORAGE=mode)
+
+    samples = {}
+    # The first launch migrates the history for the day-index and sqlite modes and is not counted.
+    for run in range(runs + 1):
+        try:
+            output = subprocess.run([sys.executable, MAIN_SCRIPT], cwd=app_dir, env=env, capture_output=True,
+                                    text=True, timeout=120, check=True).stdout
+            times = json.loads(output.strip().splitlines()[-1])
+        except (OSError, subprocess.SubprocessError, json.JSONDecodeError, IndexError) as e:
+            return None, str(e)
+        if run:
+            for name, ms in times.items():
+                samples.setdefault(name, []).append(ms)
+    return {name: latency_stats(timings) for name, timings in samples.items()}, None
+
+
+def panel_benchmark(names, repeat):
+    # The button panel needs ttkbootstrap and a display (e.g. xvfb-run); without them only the
+    # category registry half of refresh_category_buttons is measured.
+    try:
+        import tkinter as tk
+        import ttkbootstrap as ttk
+        from category_panel import CategoryPanel
+    except ImportError as e:
+        return None, str(e)
+    try:
+        root = ttk.Window()
+    except tk.TclError as e:
+        return None, str(e)
+
+    root.geometry("720x920")
+    frame = ttk.Frame(root)
+    frame.pack(fill='both', expand=True)
+    panel = CategoryPanel(frame, lambda category: None)
+    root.update()
+    lists = [names, list(reversed(names))]
+    state = {'turn': 0}
+
+    def refresh():
+        state['turn'] += 1
+        panel.set_categories(lists[state['turn'] % 2])
+        root.update_idletasks()
+
+    try:
+        return measure(refresh, repeat), None
+    finally:
+        root.destroy()
+
+
+def run_benchmarks(mode, directory, repeat, today):
+    results = {}
+    writer = BackgroundWriter(linger=0)
+    store = make_store(mode, directory, writer)
+    history = store.load()
+    writer.flush()
+
+    def load_data():
+        make_store(mode, directory).load()
+
+    def save_data():
+        store.compact(history)
+        writer.flush()
+
+    clock = {'now': datetime.strptime(today, DATE_FORMAT).timestamp() + WORKDAY_END}
+
+    def stop_tracking():
+        start = clock['now']
+        clock['now'] += 1
+        history.add_interval(DEFAULT_CATEGORIES[0], start, start + 1)
+        store.append(DEFAULT_CATEGORIES[0], start, start + 1)
+        writer.flush()
+
+    registry = CategoryRegistry(os.path.join(directory, 'categories.json'))
+    ranks = registry.ranks()
+
+    results['load_data'] = measure(load_data, repeat)
+    results['save_data'] = measure(save_data, repeat)
+    results['stop_tracking'] = measure(stop_tracking, repeat)
+    results['get_today_data'] = measure(lambda: history.day_totals(today), repeat)
+    for period in PERIODS:
+        results[f"generate_summary.{period}"] = measure(lambda: format_summary(history, period, ranks, today),
+                                                        repeat)
+    results['refresh_category_buttons.registry'] = measure(registry.categories, repeat)
+
+    panel, reason = panel_benchmark(registry.categories(), repeat)
+    if panel is not None:
+        results['refresh_category_buttons.panel'] = panel
+    else:
+        print(f"refresh_category_buttons.panel overgeslagen: {reason}", file=sys.stderr)
+
+    writer.close()
+
+    startup, reason = startup_benchmark(mode, directory, min(repeat, STARTUP_RUNS))
+    if startup is not None:
+        for name, stats in startup.items():
+            results[f"startup.{name[:-len('_ms')]}"] = stats
+    else:
+        print(f"startup overgeslagen: {reason}", file=sys.stderr)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    lines = []
+    for mode, benchmarks in results['results'].items():
+        for name, result in benchmarks.items():
+            before = baseline.get('results', {}).get(mode, {}).get(name)
+            if before is None:
+                continue
+            ratio = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+            lines.append(f"{mode:<10} {name:<36} {before['p50_ms']:>10.3f} -> {result['p50_ms']:>10.3f} ms"
+                         f"  x{ratio:.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Meet de opslag- en overzichtsfuncties op een synthetische historie.")
+    parser.add_argument('--days', type=int, default=365 * 5)
+    parser.add_argument('--categories', type=int, default=len(DEFAULT_CATEGORIES))
+    parser.add_argument('--sessions', type=int, default=8, help="sessies per dag")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end', help="laatste dag van de historie (JJJJ-MM-DD), standaard vandaag")
+    parser.add_argument('--storage', choices=STORAGE_MODES, action='append',
+                        help="opslagvorm om te meten (herhaalbaar), standaard allemaal")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help="schrijf de resultaten als JSON naar dit bestand")
+    parser.add_argument('--compare', help="vergelijk met een eerder weggeschreven resultaat")
+    args = parser.parse_args(argv)
+
+    today = args.end or datetime.now().strftime(DATE_FORMAT)
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'params': {'days': args.days, 'categories': args.categories, 'sessions': args.sessions,
+                   'seed': args.seed, 'end': today, 'repeat': args.repeat},
+        'results': {},
+    }
+    for mode in args.storage or STORAGE_MODES:
+        with tempfile.TemporaryDirectory() as directory:
+            write_dataset(directory, args.days, args.categories, args.sessions, args.seed, today)
+            results['results'][mode] = run_benchmarks(mode, directory, args.repeat, today)
+    if resource is not None:
+        results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            print(compare(results, json.load(f)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
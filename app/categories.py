@@ -0,0 +1,79 @@
+import json
+import os
+
+DEFAULT_CATEGORIES = [
+    "ACP",
+    "Application Packaging",
+    "Azure Kubernetes Platform",
+    "Connected Hosting",
+    "Identity Access Management",
+    "iDP",
+    "Local support",
+    "M365 beheer",
+    "Networking",
+    "PAM",
+    "SASE as a Service"
+]
+
+
+class CategoryRegistry:
+    # Keeps the parsed categories file in memory. The file is only parsed again when its
+    # mtime or size changes; subscribers are called whenever the list changes.
+
+    def __init__(self, path, defaults=DEFAULT_CATEGORIES):
+        self.path = path
+        self.defaults = defaults
+        self.subscribers = []
+        self._categories = None
+        self._ranks = {}
+        self._stamp = None
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _set(self, categories, stamp):
+        changed = self._categories is not None and categories != self._categories
+        self._categories = list(categories)
+        self._ranks = {category: rank for rank, category in enumerate(self._categories)}
+        self._stamp = stamp
+        if changed:
+            for callback in list(self.subscribers):
+                callback()
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if self._categories is not None and stamp == self._stamp:
+            return
+
+        categories = self.defaults
+        if stamp is not None:
+            try:
+                with open(self.path, 'r') as f:
+                    categories = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                pass
+        self._set(categories, stamp)
+
+    def categories(self):
+        self._refresh()
+        return list(self._categories)
+
+    def ranks(self):
+        self._refresh()
+        return self._ranks
+
+    def save(self, categories):
+        with open(self.path, 'w') as f:
+            json.dump(categories, f, indent=4)
+        self._set(categories, self._file_stamp())
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
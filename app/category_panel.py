@@ -0,0 +1,107 @@
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+ROW_PADDING_X = 10
+ROW_PADDING_Y = 5
+# Unused pool buttons are parked above the scroll region, where they can never be seen.
+PARKED_Y = -1000
+
+
+class CategoryPanel:
+    # Only the rows in view have a button. Buttons come from a pool and are moved and
+    # relabelled as the canvas scrolls, so the widget count follows the window height
+    # instead of the length of the category list.
+
+    def __init__(self, master, on_select, height=420):
+        self.on_select = on_select
+        self.categories = []
+        self.pool = []
+        self.assigned = []
+        self.row_height = None
+
+        self.canvas = tk.Canvas(master, height=height, highlightthickness=0, bg=ttk.Style().colors.light)
+        self.canvas.grid(row=0, column=0, sticky='nsew')
+
+        scrollbar = ttk.Scrollbar(master, orient=VERTICAL, command=self._yview, bootstyle="round")
+        scrollbar.grid(row=0, column=1, sticky='ns')
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+
+        self.canvas.bind('<Enter>', self._bind_mousewheel)
+        self.canvas.bind('<Leave>', self._unbind_mousewheel)
+        self.canvas.bind('<Configure>', self._on_canvas_resize)
+
+    def set_categories(self, categories):
+        if categories == self.categories:
+            return
+        self.categories = list(categories)
+        self._update_scrollregion()
+        self._render()
+
+    def _add_pool_button(self):
+        slot = len(self.pool)
+        button = ttk.Button(self.canvas, style="Category.Outline.TButton",
+                            command=lambda: self.on_select(self.assigned[slot]),
+                            cursor='hand2')
+        window_id = self.canvas.create_window(ROW_PADDING_X, PARKED_Y, window=button, anchor='nw',
+                                              width=self._row_width())
+        self.pool.append((button, window_id))
+        self.assigned.append(None)
+
+        if self.row_height is None:
+            button.configure(text="Categorie")
+            button.update_idletasks()
+            self.row_height = button.winfo_reqheight() + 2 * ROW_PADDING_Y
+
+    def _row_width(self):
+        return max(1, self.canvas.winfo_width() - 2 * ROW_PADDING_X)
+
+    def _update_scrollregion(self):
+        if self.row_height is None:
+            self._add_pool_button()
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(),
+                                            len(self.categories) * self.row_height + ROW_PADDING_Y))
+
+    def _render(self):
+        if self.row_height is None:
+            self._add_pool_button()
+
+        top = self.canvas.canvasy(0)
+        first = max(0, int(top // self.row_height))
+        last = min(len(self.categories), int((top + self.canvas.winfo_height()) // self.row_height) + 1)
+
+        while len(self.pool) < last - first:
+            self._add_pool_button()
+
+        for slot, (button, window_id) in enumerate(self.pool):
+            index = first + slot
+            if index < last:
+                category = self.categories[index]
+                if self.assigned[slot] != category:
+                    button.configure(text=category)
+                    self.assigned[slot] = category
+                self.canvas.coords(window_id, ROW_PADDING_X, index * self.row_height + ROW_PADDING_Y)
+            elif self.assigned[slot] is not None:
+                self.canvas.coords(window_id, ROW_PADDING_X, PARKED_Y)
+                self.assigned[slot] = None
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self._render()
+
+    def _on_canvas_resize(self, event):
+        width = self._row_width()
+        for _, window_id in self.pool:
+            self.canvas.itemconfigure(window_id, width=width)
+        self._update_scrollregion()
+        self._render()
+
+    def _on_mousewheel(self, event):
+        self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        self._render()
+
+    def _bind_mousewheel(self, event):
+        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+
+    def _unbind_mousewheel(self, event):
+        self.canvas.unbind_all("<MouseWheel>")
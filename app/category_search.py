@@ -0,0 +1,119 @@
+import heapq
+import re
+from bisect import bisect_left
+
+WORD_SPLIT = re.compile(r"[\s\-_/.,()]+")
+RESULT_LIMIT = 10
+PREFIX_END = '\U0010ffff'
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CategoryIndex:
+    # Word prefixes are kept in one sorted list, so a prefix lookup is two binary searches;
+    # trigrams map to the names containing them, which finds substrings and near misses.
+    # set_categories only touches the names that were added or removed.
+
+    def __init__(self, categories=()):
+        self.names = set()
+        self.order = {}
+        self.words = []
+        self.postings = {}
+        self.last_used = {}
+        self.uses = 0
+        self.set_categories(categories)
+
+    def set_categories(self, categories):
+        categories = list(categories)
+        new_names = set(categories)
+        for name in self.names - new_names:
+            self._remove(name)
+        added = new_names - self.names
+        for name in added:
+            self._add(name)
+        if added:
+            # The new words sit unsorted at the end; sorting a list that is mostly in order is
+            # close to linear.
+            self.words.sort()
+        self.order = {name: position for position, name in enumerate(categories)}
+
+    def _add(self, name):
+        self.names.add(name)
+        key = name.lower()
+        for word in {key, *WORD_SPLIT.split(key)}:
+            if word:
+                self.words.append((word, name))
+        for trigram in trigrams(key):
+            self.postings.setdefault(trigram, set()).add(name)
+
+    def _remove(self, name):
+        self.names.discard(name)
+        key = name.lower()
+        for word in {key, *WORD_SPLIT.split(key)}:
+            if word:
+                position = bisect_left(self.words, (word, name))
+                if position < len(self.words) and self.words[position] == (word, name):
+                    del self.words[position]
+        for trigram in trigrams(key):
+            names = self.postings.get(trigram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.postings[trigram]
+        self.last_used.pop(name, None)
+
+    def record_use(self, name):
+        self.uses += 1
+        self.last_used[name] = self.uses
+
+    def _recency(self, name):
+        if name not in self.last_used:
+            return 0.0
+        return 100.0 / (1 + self.uses - self.last_used[name])
+
+    def _prefix_matches(self, prefix):
+        # Every word starting with prefix sorts between prefix itself and prefix + the last
+        # code point; indexing the range avoids copying the tail of the list.
+        words = self.words
+        start = bisect_left(words, (prefix,))
+        end = bisect_left(words, (prefix + PREFIX_END,), start)
+        return {words[position][1] for position in range(start, end)}
+
+    def search(self, text, limit=RESULT_LIMIT):
+        query = text.strip().lower()
+        if not query:
+            # Nothing typed yet: most recently used first, then the list order.
+            return heapq.nsmallest(limit, self.names,
+                                   key=lambda name: (-self.last_used.get(name, 0), self.order.get(name, 0)))
+
+        words = [word for word in WORD_SPLIT.split(query) if word]
+        prefixed = self._prefix_matches(query)
+        if len(words) > 1:
+            # "sec 9" finds "Security 2019": every typed word starts a word of the name.
+            prefixed |= set.intersection(*(self._prefix_matches(word) for word in words))
+        scores = {name: 300.0 for name in prefixed}
+        query_trigrams = trigrams(query)
+        if query_trigrams:
+            # Names sharing at least half of the query's trigrams; tolerates a typo or two.
+            counts = {}
+            for trigram in query_trigrams:
+                for name in self.postings.get(trigram, ()):
+                    counts[name] = counts.get(name, 0) + 1
+            needed = len(query_trigrams) / 2
+            for name, count in counts.items():
+                if count >= needed:
+                    scores[name] = scores.get(name, 0.0) + 100.0 * count / len(query_trigrams)
+
+        ranked = []
+        for name, score in scores.items():
+            key = name.lower()
+            if key == query:
+                score += 1000
+            elif key.startswith(query):
+                score += 500
+            elif query in key:
+                score += 200
+            ranked.append((score + self._recency(name), -len(name), -self.order.get(name, 0), name))
+        return [name for *_, name in heapq.nlargest(limit, ranked)]
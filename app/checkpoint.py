@@ -0,0 +1,72 @@
+import os
+import struct
+import zlib
+
+SESSION_FILE = '../time_registration_session.bin'
+
+# One fixed-size record, always written over itself at offset 0: magic, session start (wall
+# time), elapsed seconds, category name, then a CRC so a torn write reads as no record.
+MAGIC = b'TTS1'
+CATEGORY_BYTES = 512
+RECORD = struct.Struct(f'<4sddH{CATEGORY_BYTES}s')
+CHECKSUM = struct.Struct('<I')
+RECORD_SIZE = RECORD.size + CHECKSUM.size
+
+
+class SessionCheckpoint:
+    # Keeps the running session on disk while it runs, so a crash or forced logoff costs at
+    # most one checkpoint interval instead of the whole session. The history files are only
+    # written when the session is stopped, as before. With a writer the records go through
+    # its queue, so a clear submitted after the booking reaches the disk after the booking.
+
+    def __init__(self, path=SESSION_FILE, fsync=False, writer=None):
+        self.path = path
+        self.fsync = fsync
+        self.writer = writer
+        self.file = None
+
+    def _write(self, data):
+        if self.writer is not None:
+            self.writer.submit(('record', self.path, data))
+            return
+        if self.file is None:
+            self.file = open(self.path, 'r+b' if os.path.exists(self.path) else 'w+b')
+        self.file.seek(0)
+        self.file.write(data)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def save(self, category, start_time, elapsed):
+        name = category.encode('utf-8')[:CATEGORY_BYTES]
+        record = RECORD.pack(MAGIC, start_time, elapsed, len(name), name)
+        try:
+            self._write(record + CHECKSUM.pack(zlib.crc32(record)))
+        except IOError as e:
+            print(f"Error writing session checkpoint {self.path}: {e}")
+
+    def clear(self):
+        try:
+            self._write(bytes(RECORD_SIZE))
+        except IOError as e:
+            print(f"Error clearing session checkpoint {self.path}: {e}")
+
+    def read(self):
+        # Returns (category, start_time, elapsed) of a session that was never stopped, or None.
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read(RECORD_SIZE)
+        except IOError:
+            return None
+        if len(data) != RECORD_SIZE:
+            return None
+        record = data[:RECORD.size]
+        magic, start_time, elapsed, length, name = RECORD.unpack(record)
+        if magic != MAGIC or CHECKSUM.unpack(data[RECORD.size:])[0] != zlib.crc32(record):
+            return None
+        return name[:length].decode('utf-8', errors='replace'), start_time, elapsed
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
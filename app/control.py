@@ -0,0 +1,99 @@
+import argparse
+import getpass
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# One control endpoint per user. Where Unix domain sockets are not available (Windows) the
+# server listens on a random localhost port instead and writes it, with a token that clients
+# must send along, to CONTROL_PORT_FILE.
+CONTROL_NAME = f"time-tracker-{getpass.getuser()}"
+CONTROL_SOCKET = os.path.join(tempfile.gettempdir(), f"{CONTROL_NAME}.sock")
+CONTROL_PORT_FILE = os.path.join(tempfile.gettempdir(), f"{CONTROL_NAME}.port")
+USE_UNIX_SOCKET = hasattr(socket, 'AF_UNIX') and sys.platform != 'win32'
+CLIENT_TIMEOUT = 5.0
+
+
+def _connect(timeout):
+    if USE_UNIX_SOCKET:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(CONTROL_SOCKET)
+        except OSError:
+            sock.close()
+            raise
+        return sock, None
+
+    with open(CONTROL_PORT_FILE, 'r') as f:
+        endpoint = json.load(f)
+    sock = socket.create_connection(('127.0.0.1', endpoint['port']), timeout=timeout)
+    return sock, endpoint['token']
+
+
+def send(command, timeout=CLIENT_TIMEOUT, **args):
+    # Returns the server's reply, or None when no instance is listening.
+    try:
+        sock, token = _connect(timeout)
+    except (OSError, json.JSONDecodeError, KeyError, TypeError):
+        return None
+
+    request = {'command': command, **args}
+    if token:
+        request['token'] = token
+    with sock:
+        try:
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            reply = b''
+            while not reply.endswith(b'\n'):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                reply += chunk
+        except OSError:
+            return None
+    try:
+        return json.loads(reply)
+    except json.JSONDecodeError:
+        return None
+
+
+def format_status(status):
+    if not status.get('category'):
+        return "Geen categorie loopt momenteel."
+    elapsed = int(status['elapsed'])
+    return f"▶️ {status['category']} {elapsed // 3600:02}:{elapsed % 3600 // 60:02}:{elapsed % 60:02}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bedien een draaiende Tijd Registratie Tool.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    start = subparsers.add_parser('start', help="start (of wissel naar) een categorie")
+    start.add_argument('category')
+    subparsers.add_parser('stop', help="stop de lopende registratie")
+    subparsers.add_parser('status', help="toon de lopende registratie")
+    summary = subparsers.add_parser('summary', help="toon een tijdsoverzicht")
+    summary.add_argument('--period', choices=('day', 'week', 'month', 'year'), default='day')
+    subparsers.add_parser('show', help="breng het venster naar voren")
+    args = vars(parser.parse_args(argv))
+
+    reply = send(**args)
+    if reply is None:
+        print("De Tijd Registratie Tool draait niet.", file=sys.stderr)
+        return 2
+    if not reply['ok']:
+        print(reply['error'], file=sys.stderr)
+        return 1
+
+    result = reply['result']
+    if isinstance(result, dict):
+        print(format_status(result))
+    elif isinstance(result, str):
+        print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import secrets
+import threading
+
+from control import CONTROL_PORT_FILE, CONTROL_SOCKET, USE_UNIX_SOCKET, send
+
+
+class ControlServer:
+    # Serves newline-delimited JSON commands from an asyncio loop on its own thread.
+    # Commands are run through call_soon (the app passes one that goes through Tk's after), so
+    # they always execute on the Tk thread; without it they run on the server thread, which is
+    # how it is used headless.
+
+    def __init__(self, commands, call_soon=None):
+        self.commands = commands
+        self.call_soon = call_soon
+        self.token = secrets.token_hex(16)
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+
+    def start(self):
+        # Only one instance per user may listen; a second one gets False and should hand over.
+        if send('ping') is not None:
+            return False
+        self.thread = threading.Thread(target=self._run, name='ControlServer', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self.server is not None
+
+    def stop(self):
+        if self.loop is not None and self.server is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=1.0)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(self._listen())
+        except OSError as e:
+            print(f"Error starting control server: {e}")
+            self.ready.set()
+            return
+
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            self.loop.close()
+            self._remove_endpoint()
+
+    async def _listen(self):
+        if USE_UNIX_SOCKET:
+            # A socket file left behind by a crashed instance; nobody answered the ping.
+            if os.path.exists(CONTROL_SOCKET):
+                os.unlink(CONTROL_SOCKET)
+            server = await asyncio.start_unix_server(self._handle, path=CONTROL_SOCKET)
+            os.chmod(CONTROL_SOCKET, 0o600)
+            return server
+
+        server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        with open(CONTROL_PORT_FILE, 'w') as f:
+            json.dump({'port': server.sockets[0].getsockname()[1], 'token': self.token}, f)
+        return server
+
+    def _remove_endpoint(self):
+        try:
+            os.unlink(CONTROL_SOCKET if USE_UNIX_SOCKET else CONTROL_PORT_FILE)
+        except OSError:
+            pass
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self._dispatch(line)
+                writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, line):
+        try:
+            request = json.loads(line)
+            name = request.pop('command')
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError):
+            return {'ok': False, 'error': "Ongeldig verzoek."}
+        if not USE_UNIX_SOCKET and request.pop('token', None) != self.token:
+            return {'ok': False, 'error': "Ongeldig token."}
+        if name == 'ping':
+            return {'ok': True, 'result': 'pong'}
+        if name not in self.commands:
+            return {'ok': False, 'error': f"Onbekend commando: {name}"}
+
+        if self.call_soon is None:
+            return self._call(self.commands[name], request)
+        future = concurrent.futures.Future()
+        try:
+            self.call_soon(lambda: future.set_result(self._call(self.commands[name], request)))
+        except Exception as e:
+            # The window is already being torn down.
+            return {'ok': False, 'error': str(e)}
+        return await asyncio.wrap_future(future)
+
+    def _call(self, command, args):
+        # Every failure becomes an error reply: on the Tk path an exception would otherwise
+        # never resolve the future and leave the client waiting until it times out.
+        try:
+            return {'ok': True, 'result': command(**args)}
+        except (KeyError, TypeError, ValueError) as e:
+            return {'ok': False, 'error': str(e)}
+        except Exception as e:
+            return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
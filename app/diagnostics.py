@@ -0,0 +1,137 @@
+import atexit
+import json
+import os
+import time
+from collections import deque
+from functools import wraps
+
+# TIME_TRACKER_DIAGNOSTICS=1 turns the timing hooks on; TIME_TRACKER_DIAGNOSTICS_FILE also turns
+# them on and writes everything measured to that file on exit. TIME_TRACKER_PROFILE=<file>
+# runs the whole session under cProfile and writes the stats there (view with pstats/snakeviz).
+DIAGNOSTICS_FILE = os.environ.get('TIME_TRACKER_DIAGNOSTICS_FILE')
+DIAGNOSTICS_ENABLED = bool(os.environ.get('TIME_TRACKER_DIAGNOSTICS') or DIAGNOSTICS_FILE)
+PROFILE_FILE = os.environ.get('TIME_TRACKER_PROFILE')
+
+RING_SIZE = 512
+RECENT_SIZE = 200
+BUCKET_LIMITS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Metric:
+    # Counters and a fixed-bucket histogram cover the whole session; percentiles come from
+    # the last RING_SIZE samples only.
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKET_LIMITS_MS) + 1)
+        self.samples = deque(maxlen=RING_SIZE)
+
+    def record(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        bucket = 0
+        while bucket < len(BUCKET_LIMITS_MS) and ms > BUCKET_LIMITS_MS[bucket]:
+            bucket += 1
+        self.buckets[bucket] += 1
+        self.samples.append(ms)
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def to_json(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p90_ms': self.percentile(0.9),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ms,
+            'histogram': {f"<={limit}ms" if limit else f">{BUCKET_LIMITS_MS[-1]}ms": count
+                          for limit, count in zip(BUCKET_LIMITS_MS + (None,), self.buckets)},
+        }
+
+
+class Diagnostics:
+    def __init__(self, enabled=DIAGNOSTICS_ENABLED):
+        self.enabled = enabled
+        self.started = time.time()
+        self.metrics = {}
+        self.recent = deque(maxlen=RECENT_SIZE)
+        self.profiler = None
+
+    def timed(self, name):
+        # Decided once, when the function is defined: with diagnostics off the function is
+        # returned as is and costs nothing extra per call.
+        def decorator(func):
+            if not self.enabled:
+                return func
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, (time.perf_counter() - start) * 1000)
+            return wrapper
+        return decorator
+
+    def record(self, name, ms):
+        if name not in self.metrics:
+            self.metrics[name] = Metric()
+        self.metrics[name].record(ms)
+        self.recent.append((time.time(), name, ms))
+
+    def to_json(self):
+        return {
+            'started': self.started,
+            'enabled': self.enabled,
+            'metrics': {name: metric.to_json() for name, metric in sorted(self.metrics.items())},
+            'recent': [{'time': at, 'name': name, 'ms': ms} for at, name, ms in self.recent],
+        }
+
+    def report(self):
+        if not self.enabled:
+            return ("Diagnose staat uit.\n"
+                    "Start de tool met TIME_TRACKER_DIAGNOSTICS=1 om de metingen bij te houden.")
+        lines = [f"{'Meting':<26}{'aantal':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)",
+                 "-" * 76]
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"{name:<26}{metric.count:>8}{metric.percentile(0.5):>9.1f}{metric.percentile(0.9):>9.1f}"
+                         f"{metric.percentile(0.99):>9.1f}{metric.max_ms:>9.1f}")
+        lines.append("")
+        lines.append("Traagste recente aanroepen:")
+        for at, name, ms in sorted(self.recent, key=lambda item: item[2], reverse=True)[:10]:
+            lines.append(f"  {time.strftime('%H:%M:%S', time.localtime(at))}  {name:<26}{ms:>9.1f} ms")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.to_json(), f, indent=4)
+        except IOError as e:
+            print(f"Error writing diagnostics to {path}: {e}")
+
+    def install(self):
+        # Called once from the entry point, so importing this module never starts a profiler.
+        if PROFILE_FILE:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+            atexit.register(self._stop_profiler)
+        if DIAGNOSTICS_FILE:
+            atexit.register(self.dump, DIAGNOSTICS_FILE)
+
+    def _stop_profiler(self):
+        self.profiler.disable()
+        self.profiler.dump_stats(PROFILE_FILE)
+
+
+diagnostics = Diagnostics()
+timed = diagnostics.timed
@@ -0,0 +1,393 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+from itertools import chain
+
+from history import DATE_FORMAT, day_bounds, split_by_day
+from retention import ARCHIVE_FILE, archive_rows
+from storage import (DAY_INDEX_FILE, DATA_FILE, JOURNAL_FILE, SQLITE_FILE, STORAGE_MODE, DayFile, DayIndexStore,
+                     SqliteStore, connect_sqlite)
+
+CHUNK_SIZE = 1 << 16
+FORMATS = ('csv', 'jsonl')
+COLUMNS = ('date', 'category', 'start', 'end', 'seconds')
+
+
+class JsonStream:
+    # Just enough of an incremental JSON reader to walk a snapshot: objects and arrays are
+    # entered one member at a time and only the leaves are decoded whole, so memory stays
+    # bounded by the largest leaf instead of by the file.
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def _next(self, expected):
+        char = self.peek()
+        if not char or char not in expected:
+            raise ValueError(f"Unexpected {char!r} in JSON stream")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number that ends the buffer, or stops at a '.' or exponent whose digits are
+            # still in the next chunk, may continue there.
+            if (end == len(self.buffer) or self.buffer[end] in '.eE') and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        self._next('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._next(':')
+            yield key
+            if self._next(',}') == '}':
+                return
+
+    def items(self):
+        self._next('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self._next(',]') == ']':
+                return
+
+
+def read_journal(path):
+    try:
+        with open(path, 'rb') as f:
+            generation = json.loads(f.readline())['generation']
+            records = []
+            for line in f:
+                if line.endswith(b'\n'):
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+            return generation, records
+    except (json.JSONDecodeError, IOError, KeyError, TypeError):
+        return None, []
+
+
+class Renames:
+    # Renames logged in the journal after the snapshot apply to everything in it.
+
+    def __init__(self, records):
+        self.renames = [record['rename'] for record in records if 'rename' in record]
+        self._names = {}
+
+    def without_first(self):
+        other = Renames([])
+        other.renames = self.renames[1:]
+        return other
+
+    def __call__(self, name):
+        if name not in self._names:
+            current = name
+            for old, new in self.renames:
+                if current == old:
+                    current = new
+            self._names[name] = current
+        return self._names[name]
+
+
+def journal_rows(records):
+    # A rename applies to what was booked before it, as when the app replays the journal,
+    # and not to a new category that takes the old name afterwards.
+    rename = Renames(records)
+    for record in records:
+        if 'rename' in record:
+            rename = rename.without_first()
+            continue
+        if 'date' in record:
+            yield record['date'], rename(record['category']), None, None, float(record['duration'])
+        else:
+            yield from interval_rows(rename(record['category']), float(record['start']), float(record['end']))
+
+
+def snapshot_header(data_file):
+    # The generation and category names; both are written before the days in a snapshot.
+    generation, names = 0, None
+    with open(data_file, 'r') as f:
+        stream = JsonStream(f)
+        if stream.peek() != '{':
+            return generation, names
+        for key in stream.members():
+            if key == 'generation':
+                generation = stream.value()
+            elif key == 'user':
+                stream.value()
+            else:
+                if key == 'categories':
+                    names = stream.value()
+                break
+    return generation, names
+
+
+def archived_rows(archive_file, data_file, journal_file):
+    # Archived days are keyed by category id; the names come from the snapshot, plus any
+    # renames journaled since, so they match the rest of the export.
+    generation, names = snapshot_header(data_file) if os.path.exists(data_file) else (0, None)
+    journal_generation, records = read_journal(journal_file)
+    yield from archive_rows(archive_file, names, Renames(records if journal_generation == generation else []))
+
+
+def first_journal_rows(journal_file):
+    # Until the first compaction there is no snapshot or index yet, only a generation 0 journal.
+    generation, records = read_journal(journal_file)
+    if generation == 0:
+        yield from journal_rows(records)
+
+
+class DaySplitter:
+    # Remembers the last day seen: consecutive intervals of a category mostly fall on the
+    # same day, and then no date arithmetic is needed at all.
+
+    def __init__(self):
+        self.date = None
+        self.day_start = 0.0
+        self.day_end = 0.0
+
+    def __call__(self, category, start, end):
+        if not self.day_start <= start < self.day_end:
+            day = datetime.fromtimestamp(start).date()
+            self.date = day.isoformat()
+            self.day_start, self.day_end = day_bounds(self.date)
+        if end <= self.day_end:
+            yield self.date, category, start, end, end - start
+            return
+        for date, piece_start, piece_end in split_by_day(start, end):
+            yield date, category, piece_start, piece_end, piece_end - piece_start
+
+
+def interval_rows(category, start, end):
+    for date, piece_start, piece_end in split_by_day(start, end):
+        yield date, category, piece_start, piece_end, piece_end - piece_start
+
+
+def snapshot_rows(data_file, journal_file):
+    journal_generation, records = read_journal(journal_file)
+    with open(data_file, 'r') as f:
+        stream = JsonStream(f)
+        if stream.peek() != '{':
+            return
+
+        generation = 0
+        rename = Renames(records if journal_generation == generation else [])
+        names = None
+        for key in stream.members():
+            if key == 'generation':
+                generation = stream.value()
+                rename = Renames(records if journal_generation == generation else [])
+            elif key == 'categories':
+                names = stream.value()
+            elif key == 'days':
+                for date in stream.members():
+                    day = stream.value()
+                    for category, seconds in day.items() if isinstance(day, dict) else day:
+                        if seconds:
+                            name = names[category] if names is not None else category
+                            yield date, rename(name), None, None, seconds
+            elif key == 'intervals':
+                split = DaySplitter()
+                for category in stream.members():
+                    name = rename(names[int(category)] if names is not None else category)
+                    for _ in stream.items():
+                        start, end = stream.value()
+                        yield from split(name, start, end)
+            else:
+                value = stream.value()
+                if isinstance(value, dict) and key[:1].isdigit():
+                    # Pre-journal files are a bare {date: {category: seconds}} dict.
+                    for category, seconds in value.items():
+                        if seconds:
+                            yield key, rename(category), None, None, seconds
+
+    if generation == journal_generation:
+        yield from journal_rows(records)
+
+
+def day_index_rows(data_file, journal_file):
+    with open(f"{data_file}.idx", 'r') as f:
+        index = json.load(f)
+    journal_generation, records = read_journal(journal_file)
+    rename = Renames(records if index['generation'] == journal_generation else [])
+    names = index.get('categories')
+
+    day_file = DayFile(data_file)
+    day_file.offsets = index['offsets']
+    for date in sorted(day_file.offsets):
+        data = day_file.read(date)
+        if data is None:
+            continue
+        days = data['days'].items() if isinstance(data['days'], dict) else data['days']
+        for category, seconds in days:
+            if seconds:
+                yield date, rename(names[category] if names is not None else category), None, None, seconds
+        for category, intervals in data['intervals'].items():
+            name = rename(names[int(category)] if names is not None else category)
+            for start, end in intervals:
+                yield date, name, start, end, end - start
+
+    if index['generation'] == journal_generation:
+        yield from journal_rows(records)
+
+
+def sqlite_rows(database_file):
+    # A read-only connection on a WAL database sees the last commit and never holds up the tracker.
+    connection = connect_sqlite(database_file, read_only=True)
+    try:
+        yield from connection.execute("SELECT date, category, start, end, seconds FROM entries "
+                                      "WHERE seconds != 0 ORDER BY date, start")
+    finally:
+        connection.close()
+
+
+def store_rows(mode=None, data_file=None, journal_file=None, archive_file=ARCHIVE_FILE):
+    mode = mode or STORAGE_MODE
+    journal_file = journal_file or JOURNAL_FILE
+    if mode == 'sqlite':
+        data_file = data_file or SQLITE_FILE
+        if os.path.exists(data_file):
+            return sqlite_rows(data_file)
+        return iter(())
+    if mode == 'day-index':
+        data_file = data_file or DAY_INDEX_FILE
+        if os.path.exists(f"{data_file}.idx"):
+            return day_index_rows(data_file, journal_file)
+        return first_journal_rows(journal_file)
+    data_file = data_file or DATA_FILE
+    # Detail moved out by the retention policy comes first: it is older than anything left.
+    archived = archived_rows(archive_file, data_file, journal_file) if archive_file else iter(())
+    if os.path.exists(data_file):
+        return chain(archived, snapshot_rows(data_file, journal_file))
+    return chain(archived, first_journal_rows(journal_file))
+
+
+def rows_for_store(store):
+    if isinstance(store, SqliteStore):
+        return sqlite_rows(store.data_file)
+    if isinstance(store, DayIndexStore):
+        return store_rows('day-index', store.data_file, store.journal_file)
+    return store_rows('json', store.data_file, store.journal_file, store.archive_file)
+
+
+def filter_rows(rows, date_from=None, date_to=None, categories=None):
+    for row in rows:
+        date, category = row[0], row[1]
+        if date_from and date < date_from:
+            continue
+        if date_to and date > date_to:
+            continue
+        if categories and category not in categories:
+            continue
+        yield row
+
+
+def format_timestamp(timestamp):
+    if timestamp is None:
+        return ''
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+
+def transform_rows(rows):
+    for date, category, start, end, seconds in rows:
+        yield date, category, format_timestamp(start), format_timestamp(end), round(seconds, 1)
+
+
+def write_csv(rows, f):
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(rows, f):
+    count = 0
+    for row in rows:
+        f.write(json.dumps(dict(zip(COLUMNS, row))) + '\n')
+        count += 1
+    return count
+
+
+def export(rows, f, fmt='csv', date_from=None, date_to=None, categories=None):
+    rows = transform_rows(filter_rows(rows, date_from, date_to, categories))
+    if fmt == 'jsonl':
+        return write_jsonl(rows, f)
+    return write_csv(rows, f)
+
+
+def export_to_file(path, fmt=None, rows=None, **filters):
+    if fmt is None:
+        fmt = 'jsonl' if path.endswith('.jsonl') else 'csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        return export(store_rows() if rows is None else rows, f, fmt, **filters)
+
+
+def valid_date(value):
+    datetime.strptime(value, DATE_FORMAT)
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporteer de tijdregistratie als CSV of JSON Lines.")
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--from', dest='date_from', type=valid_date, help="eerste datum (JJJJ-MM-DD)")
+    parser.add_argument('--to', dest='date_to', type=valid_date, help="laatste datum (JJJJ-MM-DD)")
+    parser.add_argument('--category', action='append', dest='categories', help="alleen deze categorie (herhaalbaar)")
+    parser.add_argument('--storage', choices=('json', 'day-index', 'sqlite'), default=None)
+    parser.add_argument('--data-file')
+    parser.add_argument('--journal-file')
+    parser.add_argument('--archive-file')
+    parser.add_argument('--output', help="schrijf naar dit bestand in plaats van stdout")
+    args = parser.parse_args(argv)
+
+    rows = store_rows(args.storage, args.data_file, args.journal_file, args.archive_file or ARCHIVE_FILE)
+    filters = {'date_from': args.date_from, 'date_to': args.date_to,
+               'categories': set(args.categories) if args.categories else None}
+    if args.output:
+        export_to_file(args.output, args.format, rows, **filters)
+    else:
+        export(rows, sys.stdout, args.format, **filters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,592 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import date as Date, datetime, time, timedelta
+
+DATE_FORMAT = "%Y-%m-%d"
+DAY_CACHE_SIZE = 64
+PERIODS = ('day', 'week', 'month', 'year')
+
+
+def day_bounds(date):
+    # fromisoformat is the fast C path for DATE_FORMAT strings; strptime is an order slower.
+    day_start = datetime.fromisoformat(date)
+    return day_start.timestamp(), (day_start + timedelta(days=1)).timestamp()
+
+
+def dates_between(start, end):
+    day = datetime.fromtimestamp(start).date()
+    last_day = datetime.fromtimestamp(end).date()
+    while day <= last_day:
+        yield day.strftime(DATE_FORMAT)
+        day += timedelta(days=1)
+
+
+def split_by_day(start, end):
+    while True:
+        day = datetime.fromtimestamp(start).date()
+        day_end = datetime.combine(day + timedelta(days=1), time()).timestamp()
+        if end <= day_end:
+            yield day.isoformat(), start, end
+            return
+        yield day.isoformat(), start, day_end
+        start = day_end
+
+
+def add_to(totals, key, seconds):
+    totals[key] = totals.get(key, 0) + seconds
+
+
+def period_keys(date):
+    day = Date.fromisoformat(date)
+    iso_year, iso_week, _ = day.isocalendar()
+    return {
+        'week': f"{iso_year}-W{iso_week:02}",
+        'month': day.strftime("%Y-%m"),
+        'year': day.strftime("%Y"),
+    }
+
+
+def period_range(period, key):
+    # First and last date of a period key, both inclusive.
+    if period == 'day':
+        return key, key
+    if period == 'week':
+        year, week = key.split('-W')
+        first = Date.fromisocalendar(int(year), int(week), 1)
+        return first.isoformat(), (first + timedelta(days=6)).isoformat()
+    if period == 'month':
+        year, month = map(int, key.split('-'))
+        next_month = Date(year + month // 12, month % 12 + 1, 1)
+        return f"{key}-01", (next_month - timedelta(days=1)).isoformat()
+    return f"{key}-01-01", f"{key}-12-31"
+
+
+class Rollups:
+    # Running totals per ISO week, month and year, updated with every booked piece of time
+    # so an overview of any of those periods is a single lookup. Days need no rollup: both
+    # history classes already keep per-day totals.
+
+    def __init__(self, totals=None):
+        self.totals = totals if totals is not None else {period: {} for period in PERIODS[1:]}
+        self._keys = {}
+
+    def add(self, date, category_id, seconds):
+        if date not in self._keys:
+            self._keys[date] = period_keys(date)
+        for period, key in self._keys[date].items():
+            add_to(self.totals[period].setdefault(key, {}), category_id, seconds)
+
+    def get(self, period, key):
+        return self.totals[period].get(key, {})
+
+    def drop_before(self, period, key):
+        # Period keys sort chronologically as strings.
+        for old_key in [old_key for old_key in self.totals[period] if old_key < key]:
+            del self.totals[period][old_key]
+
+    def copy(self):
+        return Rollups({period: {key: dict(totals) for key, totals in keys.items()}
+                        for period, keys in self.totals.items()})
+
+    def to_json(self):
+        return {period: {key: [[category_id, seconds] for category_id, seconds in totals.items()]
+                         for key, totals in keys.items()}
+                for period, keys in self.totals.items()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({period: {key: {category_id: seconds for category_id, seconds in totals}
+                             for key, totals in data.get(period, {}).items()}
+                    for period in PERIODS[1:]})
+
+
+class CategoryTable:
+    # History refers to categories by integer id; only this table knows their names, so a
+    # rename is a change here and not in every stored day.
+
+    def __init__(self, names=None):
+        self.names = []
+        self.ids = {}
+        for name in names or []:
+            self.ids.setdefault(name, len(self.names))
+            self.names.append(name)
+
+    def intern(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def rename(self, old, new):
+        if old not in self.ids:
+            return
+        category_id = self.ids.pop(old)
+        for other_id, name in enumerate(self.names):
+            if name == old:
+                self.names[other_id] = new
+        # Renaming onto an existing name leaves two ids with that name; named() adds them up.
+        self.ids.setdefault(new, category_id)
+
+    def named(self, totals):
+        result = {}
+        for category_id, seconds in totals.items():
+            add_to(result, self.names[category_id], seconds)
+        return result
+
+    def copy(self):
+        return CategoryTable(self.names)
+
+
+class DayRows:
+    # Per-day totals kept without intervals, stored sparse: only the categories that have
+    # time on a day get an entry in that day's id and seconds arrays. The dates are also kept
+    # sorted, so a range of days is found by bisection.
+
+    def __init__(self):
+        self.rows = {}
+        self.dates = []
+
+    def add(self, date, category_id, seconds):
+        if date not in self.rows:
+            self.rows[date] = (array('I'), array('d'))
+            insort(self.dates, date)
+        ids, values = self.rows[date]
+        for i, other_id in enumerate(ids):
+            if other_id == category_id:
+                values[i] += seconds
+                return
+        ids.append(category_id)
+        values.append(seconds)
+
+    def get(self, date):
+        if date not in self.rows:
+            return {}
+        ids, values = self.rows[date]
+        return dict(zip(ids, values))
+
+    def remove(self, date):
+        del self.rows[date]
+        del self.dates[bisect_left(self.dates, date)]
+
+    def between(self, first, last):
+        return self.dates[bisect_left(self.dates, first):bisect_right(self.dates, last)]
+
+    def items(self):
+        for date in self.rows:
+            yield date, self.get(date)
+
+    def copy(self):
+        other = DayRows()
+        other.rows = {date: (array('I', ids), array('d', values)) for date, (ids, values) in self.rows.items()}
+        other.dates = list(self.dates)
+        return other
+
+
+class IntervalIndex:
+    # Per category the intervals are kept as sorted start/end arrays plus a running sum of
+    # durations. Sessions of one category normally don't overlap, so the ends are sorted as
+    # well and a range query is two binary searches and a clip of the first and last interval.
+    # A category that does have overlapping intervals (a session booked twice, a clock jump)
+    # is answered by clipping every interval that can reach into the range instead.
+
+    def __init__(self):
+        self.starts = {}
+        self.ends = {}
+        self.prefix = {}
+        self.longest = {}
+        self.overlapping = set()
+
+    def add(self, category, start, end):
+        if category not in self.starts:
+            self.starts[category] = array('d')
+            self.ends[category] = array('d')
+            self.prefix[category] = array('d', [0.0])
+            self.longest[category] = 0.0
+        starts = self.starts[category]
+        ends = self.ends[category]
+        prefix = self.prefix[category]
+        self.longest[category] = max(self.longest[category], end - start)
+
+        if not starts or start >= starts[-1]:
+            if starts and ends[-1] > start:
+                self.overlapping.add(category)
+            starts.append(start)
+            ends.append(end)
+            prefix.append(prefix[-1] + end - start)
+            return
+
+        position = bisect_right(starts, start)
+        if (position > 0 and ends[position - 1] > start) or starts[position] < end:
+            self.overlapping.add(category)
+        starts.insert(position, start)
+        ends.insert(position, end)
+        del prefix[position + 1:]
+        for i in range(position, len(starts)):
+            prefix.append(prefix[-1] + ends[i] - starts[i])
+
+    def load(self, category, intervals):
+        intervals = sorted(intervals)
+        self.starts[category] = array('d', (start for start, _ in intervals))
+        self.ends[category] = array('d', (end for _, end in intervals))
+        prefix = self.prefix[category] = array('d', [0.0])
+        for start, end in intervals:
+            prefix.append(prefix[-1] + end - start)
+        self.longest[category] = max((end - start for start, end in intervals), default=0.0)
+        self.overlapping.discard(category)
+        if any(previous[1] > current[0] for previous, current in zip(intervals, intervals[1:])):
+            self.overlapping.add(category)
+
+    def total_between(self, category, t1, t2):
+        if category not in self.starts or t2 <= t1:
+            return 0.0
+        starts = self.starts[category]
+        ends = self.ends[category]
+        prefix = self.prefix[category]
+
+        last = bisect_left(starts, t2)
+        if category in self.overlapping:
+            # Only an interval starting less than the longest session before t1 can reach it.
+            first = bisect_right(starts, t1 - self.longest[category])
+            return sum(max(0.0, min(ends[i], t2) - max(starts[i], t1)) for i in range(first, last))
+
+        first = bisect_right(ends, t1)
+        if first >= last:
+            return 0.0
+
+        total = prefix[last] - prefix[first]
+        total -= max(0.0, t1 - starts[first])
+        total -= max(0.0, ends[last - 1] - t2)
+        return total
+
+    def totals_between(self, t1, t2):
+        totals = {}
+        for category in self.starts:
+            seconds = self.total_between(category, t1, t2)
+            if seconds > 0:
+                totals[category] = seconds
+        return totals
+
+    def intervals(self, category):
+        return zip(self.starts[category], self.ends[category])
+
+    def pop_before(self, category, t):
+        # Removes and returns the intervals that start before t. The running sums only ever
+        # enter a query as differences, so the remaining prefix stays valid as it is.
+        count = bisect_left(self.starts[category], t)
+        removed = list(zip(self.starts[category][:count], self.ends[category][:count]))
+        del self.starts[category][:count]
+        del self.ends[category][:count]
+        del self.prefix[category][:count]
+        if not self.starts[category]:
+            del self.starts[category], self.ends[category], self.prefix[category], self.longest[category]
+            self.overlapping.discard(category)
+        return removed
+
+    def copy(self):
+        other = IntervalIndex()
+        for category in self.starts:
+            other.starts[category] = array('d', self.starts[category])
+            other.ends[category] = array('d', self.ends[category])
+            other.prefix[category] = array('d', self.prefix[category])
+        other.longest = dict(self.longest)
+        other.overlapping = set(self.overlapping)
+        return other
+
+    def to_json(self):
+        return {str(category): [[start, end] for start, end in self.intervals(category)]
+                for category in self.starts}
+
+
+class History:
+    # days holds per-day totals booked before intervals were recorded; those can only be
+    # counted as whole days. Everything newer is answered from the interval index.
+
+    def __init__(self, table=None):
+        self.table = table if table is not None else CategoryTable()
+        self.days = DayRows()
+        self.index = IntervalIndex()
+        self.rollups = Rollups()
+        self._day_cache = {}
+
+    def add_interval(self, category, start, end):
+        category_id = self.table.intern(category)
+        self.index.add(category_id, start, end)
+        for date, piece_start, piece_end in split_by_day(start, end):
+            self.rollups.add(date, category_id, piece_end - piece_start)
+            self._day_cache.pop(date, None)
+
+    def add_day_total(self, date, category, seconds):
+        category_id = self.table.intern(category)
+        self.days.add(date, category_id, seconds)
+        self.rollups.add(date, category_id, seconds)
+        self._day_cache.pop(date, None)
+
+    def rebuild_rollups(self):
+        self.rollups = Rollups()
+        for date, day in self.days.items():
+            for category_id, seconds in day.items():
+                self.rollups.add(date, category_id, seconds)
+        for category_id in self.index.starts:
+            for start, end in self.index.intervals(category_id):
+                for date, piece_start, piece_end in split_by_day(start, end):
+                    self.rollups.add(date, category_id, piece_end - piece_start)
+
+    def rename_category(self, old, new):
+        self.table.rename(old, new)
+
+    def day_totals(self, date):
+        if date not in self._day_cache:
+            totals = self.days.get(date)
+            for category_id, seconds in self.index.totals_between(*day_bounds(date)).items():
+                add_to(totals, category_id, seconds)
+            self._day_cache[date] = totals
+        return self.table.named(self._day_cache[date])
+
+    def period_totals(self, period, key):
+        if period == 'day':
+            return self.day_totals(key)
+        return self.table.named(self.rollups.get(period, key))
+
+    def period_items(self, period):
+        if period != 'day':
+            for key, totals in self.rollups.totals[period].items():
+                yield key, self.table.named(totals)
+            return
+
+        dates = set(self.days.rows)
+        for category_id in self.index.starts:
+            for start, end in self.index.intervals(category_id):
+                dates.update(dates_between(start, end))
+        for date in sorted(dates):
+            yield date, self.day_totals(date)
+
+    def totals_between(self, t1, t2):
+        totals = self.index.totals_between(t1, t2)
+        first = datetime.fromtimestamp(t1).strftime(DATE_FORMAT)
+        last = datetime.fromtimestamp(t2).strftime(DATE_FORMAT)
+        for date in self.days.between(first, last):
+            # Only the days at either end can be partly outside the range.
+            day_start, day_end = day_bounds(date)
+            if t1 <= day_start and day_end <= t2:
+                for category_id, seconds in self.days.get(date).items():
+                    add_to(totals, category_id, seconds)
+        return self.table.named(totals)
+
+    def first_date(self):
+        dates = self.days.dates[:1]
+        dates += [datetime.fromtimestamp(starts[0]).strftime(DATE_FORMAT) for starts in self.index.starts.values()]
+        return min(dates) if dates else None
+
+    def pop_detail_before(self, date):
+        # Takes day totals and intervals before `date` out of the history and returns them as
+        # one record per day, keyed by category id: ids outlive renames, names don't. Intervals
+        # running past midnight into `date` are cut there and the rest stays. Rollups are left alone.
+        cutoff = day_bounds(date)[0]
+        records = {}
+        for day in self.days.dates[:bisect_left(self.days.dates, date)]:
+            record = records.setdefault(day, new_day_record(day))
+            for category_id, seconds in self.days.get(day).items():
+                add_to(record['days'], category_id, seconds)
+            self.days.remove(day)
+        for category_id in list(self.index.starts):
+            for start, end in self.index.pop_before(category_id, cutoff):
+                if end > cutoff:
+                    self.index.add(category_id, cutoff, end)
+                    end = cutoff
+                for day, piece_start, piece_end in split_by_day(start, end):
+                    record = records.setdefault(day, new_day_record(day))
+                    record['intervals'].setdefault(category_id, []).append([piece_start, piece_end])
+        self._day_cache.clear()
+        return [records[day] for day in sorted(records)]
+
+    def entries(self):
+        # Every booking as (date, category, start, end, seconds), intervals clipped at midnight.
+        # Day totals from before intervals were recorded have no start and end.
+        names = self.table.names
+        for date, day in self.days.items():
+            for category_id, seconds in day.items():
+                yield date, names[category_id], None, None, seconds
+        for category_id in self.index.starts:
+            for start, end in self.index.intervals(category_id):
+                for date, piece_start, piece_end in split_by_day(start, end):
+                    yield date, names[category_id], piece_start, piece_end, piece_end - piece_start
+
+    def copy(self):
+        other = History(self.table.copy())
+        other.days = self.days.copy()
+        other.index = self.index.copy()
+        other.rollups = self.rollups.copy()
+        return other
+
+    def to_json(self):
+        return {
+            'categories': self.table.names,
+            'days': {date: [[category_id, seconds] for category_id, seconds in day.items()]
+                     for date, day in self.days.items()},
+            'intervals': self.index.to_json(),
+            'rollups': self.rollups.to_json(),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if 'categories' not in data:
+            # Snapshots written before category ids were introduced are keyed by name.
+            history = cls()
+            for date, day in data['days'].items():
+                for category, seconds in day.items():
+                    if seconds:
+                        history.add_day_total(date, category, seconds)
+            for category, intervals in data.get('intervals', {}).items():
+                history.index.load(history.table.intern(category), intervals)
+            history.rebuild_rollups()
+            return history
+
+        history = cls(CategoryTable(data['categories']))
+        for date, day in data['days'].items():
+            for category_id, seconds in day:
+                history.days.add(date, category_id, seconds)
+        for category_id, intervals in data.get('intervals', {}).items():
+            history.index.load(int(category_id), intervals)
+        if 'rollups' in data:
+            history.rollups = Rollups.from_json(data['rollups'])
+        else:
+            history.rebuild_rollups()
+        return history
+
+
+def new_day_record(date):
+    return {'date': date, 'days': {}, 'intervals': {}}
+
+
+def with_totals(record):
+    totals = dict(record['days'])
+    for category_id, intervals in record['intervals'].items():
+        add_to(totals, category_id, sum(end - start for start, end in intervals))
+    record['totals'] = totals
+    return record
+
+
+def record_to_json(record):
+    return {
+        'date': record['date'],
+        'days': [[category_id, seconds] for category_id, seconds in record['days'].items()],
+        'intervals': {str(category_id): intervals for category_id, intervals in record['intervals'].items()},
+    }
+
+
+def record_from_json(data, table, named=False):
+    if named:
+        # Day files written before category ids were introduced are keyed by name.
+        days = {table.intern(category): seconds for category, seconds in data['days'].items()}
+        intervals = {table.intern(category): value for category, value in data['intervals'].items()}
+    else:
+        days = {category_id: seconds for category_id, seconds in data['days']}
+        intervals = {int(category_id): value for category_id, value in data['intervals'].items()}
+    return with_totals({'date': data['date'], 'days': days, 'intervals': intervals})
+
+
+class LazyHistory:
+    # Same queries as History, but backed by a day file that is read one day at a time.
+    # Intervals are stored clipped at midnight, so a day never needs its neighbours.
+    # Days read for a query go through a small LRU cache; days changed in this session
+    # stay pinned in memory because their new contents only reach disk at compaction.
+
+    def __init__(self, day_file, table=None, rollups=None, cache_size=DAY_CACHE_SIZE):
+        self.day_file = day_file
+        self.table = table if table is not None else CategoryTable()
+        self.rollups = rollups if rollups is not None else Rollups()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.pinned = {}
+        self.changed = set()
+
+    def _read(self, date):
+        data = self.day_file.read(date)
+        if data is None:
+            return None
+        return record_from_json(data, self.table, self.day_file.named)
+
+    def record(self, date):
+        if date in self.pinned:
+            return self.pinned[date]
+        if date in self.cache:
+            self.cache.move_to_end(date)
+            return self.cache[date]
+
+        record = self._read(date)
+        if record is None:
+            return None
+        self.cache[date] = record
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return record
+
+    def _edit(self, date):
+        if date not in self.pinned:
+            record = self.cache.pop(date, None) or self._read(date)
+            self.pinned[date] = record or with_totals(new_day_record(date))
+        self.changed.add(date)
+        return self.pinned[date]
+
+    def add_interval(self, category, start, end):
+        category_id = self.table.intern(category)
+        for date, piece_start, piece_end in split_by_day(start, end):
+            record = self._edit(date)
+            record['intervals'].setdefault(category_id, []).append([piece_start, piece_end])
+            add_to(record['totals'], category_id, piece_end - piece_start)
+            self.rollups.add(date, category_id, piece_end - piece_start)
+
+    def add_day_total(self, date, category, seconds):
+        category_id = self.table.intern(category)
+        record = self._edit(date)
+        add_to(record['days'], category_id, seconds)
+        add_to(record['totals'], category_id, seconds)
+        self.rollups.add(date, category_id, seconds)
+
+    def rebuild_rollups(self):
+        self.rollups = Rollups()
+        for date in self.day_file.offsets:
+            record = self.pinned.get(date) or self._read(date)
+            if record is None:
+                continue
+            for category_id, seconds in record['totals'].items():
+                self.rollups.add(date, category_id, seconds)
+        for date in self.pinned.keys() - self.day_file.offsets.keys():
+            for category_id, seconds in self.pinned[date]['totals'].items():
+                self.rollups.add(date, category_id, seconds)
+
+    def rename_category(self, old, new):
+        self.table.rename(old, new)
+
+    def take_changed(self):
+        records = [self.pinned[date] for date in sorted(self.changed)]
+        self.changed = set()
+        return records
+
+    def day_totals(self, date):
+        record = self.record(date)
+        return self.table.named(record['totals']) if record is not None else {}
+
+    def period_totals(self, period, key):
+        if period == 'day':
+            return self.day_totals(key)
+        return self.table.named(self.rollups.get(period, key))
+
+    def totals_between(self, t1, t2):
+        totals = {}
+        for date in dates_between(t1, t2):
+            record = self.record(date)
+            if record is None:
+                continue
+            day_start, day_end = day_bounds(date)
+            if t1 <= day_start and day_end <= t2:
+                for category_id, seconds in record['totals'].items():
+                    add_to(totals, category_id, seconds)
+                continue
+            for category_id, intervals in record['intervals'].items():
+                for start, end in intervals:
+                    seconds = min(end, t2) - max(start, t1)
+                    if seconds > 0:
+                        add_to(totals, category_id, seconds)
+        return self.table.named(totals)
@@ -1,47 +1,57 @@
+import time
+
+# Taken before the other imports so the startup measurement includes them.
+LAUNCHED = time.perf_counter()
+
 import sys
+import json
+import queue
+import threading
 import tkinter as tk
 from tkinter import messagebox
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-import time
-import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from categories import CategoryRegistry
+from category_panel import CategoryPanel
+from category_search import CategoryIndex
+from checkpoint import SessionCheckpoint
+from control import send
+from diagnostics import diagnostics, timed
+from history import PERIODS
+from storage import BackgroundWriter, open_store
+from summary import SUMMARY_PERIODS, format_summary, format_time
+from ticker import Ticker
 
 CATEGORIES_FILE = 'resources/categories.json'
-DATA_FILE = '../time_registration_data.json'
+FSYNC_WRITES = False
+
+# Prints the startup timings as JSON and quits once the window is usable; bench.py uses this.
+STARTUP_REPORT = bool(os.environ.get('TIME_TRACKER_STARTUP_REPORT'))
+FIRST_PAINT_TIMEOUT = 1000
+# Old detail is archived in small steps while the tool is idle, starting a while after launch.
+RETENTION_DELAY = 10000
+RETENTION_STEP_INTERVAL = 2000
+# The running session is checkpointed this often; a crash loses at most this much time.
+CHECKPOINT_INTERVAL = 30000
 
 ILIONX_RED = '#E8004C'
 ILIONX_DARK = '#212529'
 
 
-def load_categories():
-    if os.path.exists(CATEGORIES_FILE):
-        try:
-            with open(CATEGORIES_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            pass
+category_registry = CategoryRegistry(CATEGORIES_FILE)
+
 
-    return [
-    "ACP",
-    "Application Packaging",
-    "Azure Kubernetes Platform",
-    "Connected Hosting",
-    "Identity Access Management",
-    "iDP",
-    "Local support",
-    "M365 beheer",
-    "Networking",
-    "PAM",
-    "SASE as a Service"
-]
+@timed('load_categories')
+def load_categories():
+    return category_registry.categories()
 
 
 def save_categories(categories):
     try:
-        with open(CATEGORIES_FILE, 'w') as f:
-            json.dump(categories, f, indent=4)
+        category_registry.save(categories)
     except IOError as e:
         messagebox.showerror("Fout", f"Kon categorieën niet opslaan: {e}")
 
@@ -69,6 +79,8 @@ class CategoryManager:
         self.dialog.geometry(f"{dialog_width}x{dialog_height}+{new_x}+{new_y}")
 
         self.categories = load_categories()
+        category_registry.subscribe(self.on_categories_changed)
+        self.dialog.protocol("WM_DELETE_WINDOW", self.close_manager)
 
         master_frame = ttk.Frame(self.dialog, padding=20, bootstyle="light")
         master_frame.pack(fill='both', expand=True)
@@ -113,6 +125,10 @@ class CategoryManager:
         ttk.Button(master_frame, text="Sluiten & Vernieuwen", command=self.close_manager, style="Action.TButton").pack(
             pady=20, fill='x')
 
+    def on_categories_changed(self):
+        self.categories = load_categories()
+        self.refresh_listbox()
+
     def refresh_listbox(self):
         self.listbox.delete(0, END)
         for category in self.categories:
@@ -131,7 +147,6 @@ class CategoryManager:
         if new_cat and new_cat not in self.categories:
             self.categories.append(new_cat)
             save_categories(self.categories)
-            self.refresh_listbox()
             self.new_category_var.set("")
         else:
             messagebox.showwarning("Fout", "Voer een unieke categorie naam in.")
@@ -145,7 +160,7 @@ class CategoryManager:
             if new_cat and new_cat != old_cat:
                 self.categories[index] = new_cat
                 save_categories(self.categories)
-                self.refresh_listbox()
+                self.app.rename_category(old_cat, new_cat)
                 self.new_category_var.set("")
             else:
                 messagebox.showwarning("Fout", "Voer een geldige, gewijzigde naam in.")
@@ -161,26 +176,103 @@ class CategoryManager:
                                    f"Weet je zeker dat je '{category_to_delete}' wilt verwijderen?"):
                 del self.categories[index]
                 save_categories(self.categories)
-                self.refresh_listbox()
                 self.new_category_var.set("")
-                self.app.refresh_category_buttons()
 
         except IndexError:
             messagebox.showwarning("Fout", "Selecteer eerst een categorie om te verwijderen.")
 
     def close_manager(self):
-        self.app.refresh_category_buttons()
+        category_registry.unsubscribe(self.on_categories_changed)
         self.dialog.destroy()
 
 
 class TimeRegistrationApp:
-    def __init__(self, master):
+    # Startup is staged so the window shows up before the slow parts run: the constructor
+    # only builds the header and the status line. Once those are painted the history is
+    # loaded, and in the next idle step the categories and buttons are built.
+
+    def __init__(self, master, on_ready=None):
         self.master = master
+        self.on_ready = on_ready
         master.title("Tijd Registratie Tool")
 
         s = ttk.Style()
 
         bg_light = '#F8F9FA'
+        fg_dark = ILIONX_DARK
+        primary_color = ILIONX_RED
+
+        s.configure("Status.TLabel",
+                    padding=(15, 15),
+                    font=('Inter', 12, 'italic'),
+                    foreground=primary_color,
+                    background=bg_light)
+
+        s.configure("Header.TLabel",
+                    font=('Inter', 24, 'bold'),
+                    foreground=fg_dark,
+                    background='white')
+
+        master.grid_columnconfigure(0, weight=1)
+        master.grid_rowconfigure(2, weight=1)
+
+        self.current_category = None
+        self.start_time = None
+        self.ticker = Ticker(master, self.update_display)
+        self.history = None
+        self.categories = []
+        self.category_index = CategoryIndex()
+        self.startup_times = {}
+
+        self.user_id = os.environ.get('USERNAME', 'Gebruiker')
+        self.writer = BackgroundWriter(fsync=FSYNC_WRITES)
+        self.store = open_store(writer=self.writer, user_id=self.user_id)
+        self.checkpoint = SessionCheckpoint(fsync=FSYNC_WRITES, writer=self.writer)
+        self._checkpoint_job = None
+
+        header_frame = ttk.Frame(master, padding=(20, 10), style='Header.TLabel')
+        header_frame.grid(row=0, column=0, sticky='ew')
+        header_frame.grid_columnconfigure(0, weight=1)
+
+        ttk.Label(header_frame, text="Tijd Registratie Tool", style="Header.TLabel").grid(row=0, column=0, pady=5)
+
+        self.status_var = tk.StringVar(value="Bezig met laden...")
+        status_label = ttk.Label(master, textvariable=self.status_var,
+                                 style="Status.TLabel",
+                                 anchor='w')
+        status_label.grid(row=1, column=0, sticky='ew', padx=20, pady=(0, 15))
+
+        self.content_frame = ttk.Frame(master, padding=(0, 0))
+        self.content_frame.grid(row=2, column=0, sticky='nsew', padx=20, pady=10)
+        self.content_frame.grid_columnconfigure(0, weight=1)
+        self.content_frame.grid_rowconfigure(1, weight=1)
+
+        self._status_label = status_label
+        self._expose_binding = status_label.bind('<Expose>', self._on_first_paint, add='+')
+        # A window started minimized is never exposed; load anyway after a moment.
+        master.after(FIRST_PAINT_TIMEOUT, self._on_first_paint)
+
+    def _mark_startup(self, name):
+        ms = (time.perf_counter() - LAUNCHED) * 1000
+        self.startup_times[name] = ms
+        if diagnostics.enabled:
+            diagnostics.record(f"startup.{name}", ms)
+
+    def _on_first_paint(self, event=None):
+        if 'first_paint_ms' in self.startup_times:
+            return
+        self._status_label.unbind('<Expose>', self._expose_binding)
+        self._mark_startup('first_paint_ms')
+        self.master.after_idle(self._load_history)
+
+    def _load_history(self):
+        self.history = self.load_data()
+        self.master.after_idle(self._build_controls)
+
+    def _build_controls(self):
+        master = self.master
+        s = ttk.Style()
+
         fg_dark = ILIONX_DARK
         primary_color = ILIONX_RED
         danger_color = '#C82333'
@@ -218,44 +310,7 @@ class TimeRegistrationApp:
               background=[('active', danger_color)],
               foreground=[('active', 'white')])
 
-        s.configure("Status.TLabel",
-                    padding=(15, 15),
-                    font=('Inter', 12, 'italic'),
-                    foreground=primary_color,
-                    background=bg_light)
-
-        s.configure("Header.TLabel",
-                    font=('Inter', 24, 'bold'),
-                    foreground=fg_dark,
-                    background='white')
-
-        master.grid_columnconfigure(0, weight=1)
-        master.grid_rowconfigure(2, weight=1)
-
-        self.current_category = None
-        self.start_time = None
-
-        self.categories = load_categories()
-        self.session_data = self.load_data()
-        self.user_id = os.environ.get('USERNAME', 'Gebruiker')
-
-        header_frame = ttk.Frame(master, padding=(20, 10), style='Header.TLabel')
-        header_frame.grid(row=0, column=0, sticky='ew')
-        header_frame.grid_columnconfigure(0, weight=1)
-
-        ttk.Label(header_frame, text="Tijd Registratie Tool", style="Header.TLabel").grid(row=0, column=0, pady=5)
-
-        self.status_var = tk.StringVar(value="Selecteer een categorie om te starten.")
-        ttk.Label(master, textvariable=self.status_var,
-                  style="Status.TLabel",
-                  anchor='w').grid(row=1, column=0, sticky='ew', padx=20, pady=(0, 15))
-
-        content_frame = ttk.Frame(master, padding=(0, 0))
-        content_frame.grid(row=2, column=0, sticky='nsew', padx=20, pady=10)
-        content_frame.grid_columnconfigure(0, weight=1)
-        content_frame.grid_rowconfigure(1, weight=1)
-
-        header_controls = ttk.Frame(content_frame)
+        header_controls = ttk.Frame(self.content_frame)
         header_controls.grid(row=0, column=0, pady=(0, 10), sticky='ew')
         header_controls.columnconfigure(0, weight=1)
 
@@ -266,28 +321,19 @@ class TimeRegistrationApp:
         ttk.Button(header_controls, text="Beheer Categorieën", command=lambda: CategoryManager(self.master, self),
                    bootstyle="outline-primary").grid(row=0, column=1, padx=10, sticky='e')
 
-        canvas_frame = ttk.Frame(content_frame)
+        ttk.Button(header_controls, text="Exporteren", command=self.export_data,
+                   bootstyle="outline-primary").grid(row=0, column=2, sticky='e')
+
+        ttk.Button(header_controls, text="Analyse", command=self.show_analysis_dialog,
+                   bootstyle="outline-primary").grid(row=0, column=3, padx=(10, 0), sticky='e')
+
+        canvas_frame = ttk.Frame(self.content_frame)
         canvas_frame.grid(row=1, column=0, sticky='nsew')
         canvas_frame.grid_columnconfigure(0, weight=1)
         canvas_frame.grid_rowconfigure(0, weight=1)
 
-        self.category_canvas = tk.Canvas(canvas_frame, height=420, highlightthickness=0, bg='white')
-        self.category_canvas.grid(row=0, column=0, sticky='nsew')
-
-        category_scrollbar = ttk.Scrollbar(canvas_frame, orient=VERTICAL, command=self.category_canvas.yview,
-                                             bootstyle="round")
-        category_scrollbar.grid(row=0, column=1, sticky='ns')
-
-        self.category_canvas.configure(yscrollcommand=category_scrollbar.set)
-
-        self.inner_frame = ttk.Frame(self.category_canvas, bootstyle="light")
-
-        self.canvas_window_id = self.category_canvas.create_window((0, 0), window=self.inner_frame, anchor="nw")
-
-        self.inner_frame.bind("<Configure>", self._on_frame_configure)
-        self.category_canvas.bind('<Enter>', self._bind_mousewheel)
-        self.category_canvas.bind('<Leave>', self._unbind_mousewheel)
-        self.category_canvas.bind('<Configure>', self._on_canvas_resize)
+        self.category_panel = CategoryPanel(canvas_frame, self.start_tracking)
+        category_registry.subscribe(self.refresh_category_buttons)
 
         self.refresh_category_buttons()
 
@@ -305,97 +351,76 @@ class TimeRegistrationApp:
         ttk.Button(action_frame, text="RESET ALLE Data", command=self.reset_data,
                    style="Action.TButton").grid(row=0, column=2, padx=5, sticky='ew')
 
-        self.update_display()
+        # Hidden on purpose: support asks for it when someone reports the tool hanging.
+        master.bind('<Control-Shift-D>', lambda event: self.show_diagnostics_dialog())
+        master.bind('<Control-k>', lambda event: self.show_quick_switch())
+        master.bind('<Control-K>', lambda event: self.show_quick_switch())
 
-    def refresh_category_buttons(self):
-        for widget in self.inner_frame.winfo_children():
-            widget.destroy()
-
-        self.categories = load_categories()
-
-        for category in self.categories:
-            btn = ttk.Button(self.inner_frame, text=category,
-                             style="Category.Outline.TButton",
-                             command=lambda c=category: self.start_tracking(c),
-                             cursor='hand2')
-            btn.pack(fill='x', expand=True, pady=(5, 5), padx=10)
+        self.status_var.set("Selecteer een categorie om te starten.")
+        self.master.after_idle(self._on_interactive)
 
-        self.inner_frame.update_idletasks()
-        self._on_frame_configure(None)
+    def _on_interactive(self):
+        self._mark_startup('interactive_ms')
+        self.master.after(RETENTION_DELAY, self.apply_retention)
+        if not STARTUP_REPORT:
+            self.recover_session()
+        if self.on_ready is not None:
+            self.on_ready()
 
-    def _on_frame_configure(self, event):
-        self.category_canvas.configure(scrollregion=self.category_canvas.bbox("all"))
-
-    def _on_canvas_resize(self, event):
-        canvas_width = event.width
-        self.category_canvas.itemconfig(self.canvas_window_id, width=canvas_width)
+    @timed('refresh_category_buttons')
+    def refresh_category_buttons(self):
+        self.categories = load_categories()
+        self.category_panel.set_categories(self.categories)
+        self.category_index.set_categories(self.categories)
 
-    def _on_mousewheel(self, event):
-        self.category_canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+    @timed('load_data')
+    def load_data(self):
+        return self.store.load()
 
-    def _bind_mousewheel(self, event):
-        self.category_canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+    @timed('save_data')
+    def save_data(self):
+        self.store.compact(self.history)
 
-    def _unbind_mousewheel(self, event):
-        self.category_canvas.unbind_all("<MouseWheel>")
+    @timed('apply_retention')
+    def apply_retention(self):
+        if self.store.apply_retention(self.history):
+            self.master.after(RETENTION_STEP_INTERVAL, self.apply_retention)
 
-    def load_data(self):
-        if not os.path.exists(DATA_FILE):
-            return {}
-        try:
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    return data
-                return {}
-        except (json.JSONDecodeError, IOError) as e:
-            return {}
+    def close(self):
+        if self.store.pending:
+            self.save_data()
+        self.writer.close()
+        self.checkpoint.close()
 
-    def save_data(self):
-        try:
-            with open(DATA_FILE, 'w') as f:
-                json.dump(self.session_data, f, indent=4)
-        except IOError as e:
-            print(f"Error saving data: {e}")
-
-    def get_today_data(self):
-        today_date = datetime.now().strftime("%Y-%m-%d")
-        if today_date not in self.session_data:
-            self.session_data[today_date] = {category: 0 for category in self.categories}
-        return self.session_data[today_date]
-
-    def format_time(self, seconds):
-        td = timedelta(seconds=int(seconds))
-        total_seconds = int(td.total_seconds())
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-        return f"{hours:02}:{minutes:02}:{seconds:02}"
+    def rename_category(self, old_name, new_name):
+        self.history.rename_category(old_name, new_name)
+        if self.store.log_rename(old_name, new_name):
+            self.save_data()
+        if self.current_category == old_name:
+            self.current_category = new_name
 
     def start_tracking(self, new_category):
         self.stop_tracking()
 
+        # Wall time only anchors the session; its length comes from the monotonic clock, so
+        # NTP corrections and DST changes while tracking don't change what gets booked.
         self.current_category = new_category
         self.start_time = time.time()
+        self.category_index.record_use(new_category)
+        self.ticker.start()
+        self.write_checkpoint()
 
-        self.status_var.set(f"▶️ Registreren: {self.current_category}\nVerstreken: 00:00:00")
-
-        today_data = self.get_today_data()
-        if new_category not in today_data:
-            today_data[new_category] = 0
-
+    @timed('stop_tracking')
     def stop_tracking(self):
         if self.current_category is not None:
-            end_time = time.time()
-            duration = end_time - self.start_time
+            end_time = self.start_time + self.ticker.elapsed()
+            self.ticker.stop()
 
-            today_data = self.get_today_data()
-            if self.current_category in today_data:
-                today_data[self.current_category] += duration
-            else:
-                today_data[self.current_category] = duration
-
-            self.save_data()
+            self.history.add_interval(self.current_category, self.start_time, end_time)
+            if self.store.append(self.current_category, self.start_time, end_time):
+                self.save_data()
+            self.master.after_cancel(self._checkpoint_job)
+            self.checkpoint.clear()
 
             self.current_category = None
             self.start_time = None
@@ -403,62 +428,133 @@ class TimeRegistrationApp:
         else:
             self.status_var.set("Geen categorie loopt momenteel.")
 
-    def update_display(self):
-        if self.current_category is not None:
-            elapsed_seconds = time.time() - self.start_time
-            formatted_time = self.format_time(elapsed_seconds)
-            self.status_var.set(f"▶️ Registreren: {self.current_category}\nVerstreken: {formatted_time}")
-
-        self.master.after(1000, self.update_display)
+    def write_checkpoint(self):
+        # Runs on after() rather than on the ticker, which pauses while the window is minimized.
+        self.checkpoint.save(self.current_category, self.start_time, self.ticker.elapsed())
+        self._checkpoint_job = self.master.after(CHECKPOINT_INTERVAL, self.write_checkpoint)
+
+    def recover_session(self):
+        session = self.checkpoint.read()
+        if session is None:
+            return
+        category, start_time, elapsed = session
+        end_time = start_time + elapsed
+        # Stopped after all, but the checkpoint wasn't cleared before the tool went down.
+        booked = self.history.totals_between(start_time, end_time).get(category, 0)
+        if elapsed >= 1 and booked < elapsed - 1 and messagebox.askyesno(
+                "Onderbroken registratie",
+                f"De registratie van '{category}' is niet afgesloten, bijvoorbeeld door een crash.\n\n"
+                f"Gestart: {datetime.fromtimestamp(start_time):%d-%m-%Y %H:%M}\n"
+                f"Laatst bijgewerkt: {datetime.fromtimestamp(end_time):%d-%m-%Y %H:%M}\n"
+                f"Duur: {format_time(elapsed)}\n\n"
+                "Wil je deze tijd alsnog boeken?"):
+            self.history.add_interval(category, start_time, end_time)
+            if self.store.append(category, start_time, end_time):
+                self.save_data()
+        self.checkpoint.clear()
+
+    def status(self):
+        if self.current_category is None:
+            return {'category': None, 'elapsed': 0}
+        return {'category': self.current_category, 'elapsed': self.ticker.elapsed()}
+
+    def control_commands(self):
+        def start(category):
+            if category not in self.categories:
+                raise ValueError(f"Onbekende categorie: {category}")
+            self.start_tracking(category)
+            return self.status()
+
+        def stop():
+            self.stop_tracking()
+            return self.status()
+
+        def show():
+            self.master.deiconify()
+            self.master.lift()
+            self.master.focus_force()
+
+        return {
+            'start': start,
+            'stop': stop,
+            'status': self.status,
+            'summary': lambda period='day': self.format_summary(period),
+            'show': show,
+        }
+
+    @timed('update_display')
+    def update_display(self, elapsed_seconds):
+        formatted_time = format_time(elapsed_seconds)
+        self.status_var.set(f"▶️ Registreren: {self.current_category}\nVerstreken: {formatted_time}")
 
     def reset_data(self):
         if messagebox.askyesno("Bevestig Reset",
                                "Weet je zeker dat je ALLE geregistreerde tijd permanent wilt verwijderen? Dit kan niet ongedaan gemaakt worden."):
             self.stop_tracking()
-            self.session_data = {}
+            self.history = self.store.new_history()
 
             try:
-                if os.path.exists(DATA_FILE):
-                    os.remove(DATA_FILE)
+                self.store.reset()
                 messagebox.showinfo("Reset Succesvol", "Alle tijdregistratie data is gewist.")
                 self.status_var.set("Alle data gewist. Selecteer een categorie om te starten.")
             except IOError as e:
                 messagebox.showerror("Fout", f"Fout bij verwijderen data: {e}.")
 
-    def generate_summary(self):
-        self.stop_tracking()
-
-        today_data = self.get_today_data()
-        summary_lines = [f"Dagelijks Tijdsoverzicht: {datetime.now().strftime('%Y-%m-%d')}\n",
-                            "--------------------------------------------------"]
+    def export_data(self):
+        from tkinter import filedialog
+        from export import export_to_file, rows_for_store
 
-        total_time_seconds = 0
+        path = filedialog.asksaveasfilename(parent=self.master, title="Exporteren",
+                                            defaultextension='.csv',
+                                            filetypes=[("CSV", '*.csv'), ("JSON Lines", '*.jsonl')])
+        if not path:
+            return
 
-        current_categories = load_categories()
+        # The export reads the files on disk, so everything queued must be written first.
+        self.stop_tracking()
+        self.writer.flush()
+        results = queue.Queue()
 
-        sorted_data = sorted(today_data.items(), key=lambda item: current_categories.index(item[0]) if item[
-                                                                                                                  0] in current_categories else 1000)
+        def run():
+            try:
+                results.put(export_to_file(path, rows=rows_for_store(self.store)))
+            except Exception as e:
+                # Anything uncaught would end the thread without a result and check_export
+                # would keep polling for good.
+                results.put(e)
 
-        for category, seconds in sorted_data:
-            if seconds > 0:
-                formatted_duration = self.format_time(seconds)
-                summary_lines.append(f"{category:<30}: {formatted_duration}")
-                total_time_seconds += seconds
+        threading.Thread(target=run, daemon=True).start()
+        self.status_var.set("Bezig met exporteren...")
+        self.master.after(100, self.check_export, path, results)
 
-        if total_time_seconds == 0:
-            summary_lines.append("\nEr is vandaag geen tijd geregistreerd.")
-            return "\n".join(summary_lines)
+    def check_export(self, path, results):
+        try:
+            result = results.get_nowait()
+        except queue.Empty:
+            self.master.after(100, self.check_export, path, results)
+            return
+
+        if isinstance(result, Exception):
+            self.status_var.set("Exporteren mislukt.")
+            messagebox.showerror("Fout", f"Fout bij exporteren: {result}")
+        else:
+            self.status_var.set(f"{result} regels geëxporteerd naar {os.path.basename(path)}.")
+            messagebox.showinfo("Export Voltooid", f"{result} regels geëxporteerd naar {path}.")
 
-        summary_lines.append("--------------------------------------------------")
-        summary_lines.append(f"TOTALE GEREGISTREERDE TIJD: {self.format_time(total_time_seconds)}")
+    @timed('generate_summary')
+    def generate_summary(self, period='day'):
+        self.stop_tracking()
+        return self.format_summary(period)
 
-        return "\n".join(summary_lines)
+    @timed('format_summary')
+    def format_summary(self, period='day'):
+        return format_summary(self.history, period, category_registry.ranks())
 
     def generate_summary_dialog(self):
-        summary_text = self.generate_summary()
+        self.stop_tracking()
 
         dialog = ttk.Toplevel(self.master, resizable=(False, False))
-        dialog.title("Dagelijks Tijdsoverzicht")
+        dialog.title("Tijdsoverzicht")
 
         dialog_width = 480
         dialog_height = 500
@@ -474,24 +570,28 @@ class TimeRegistrationApp:
         summary_frame = ttk.Frame(dialog, padding=20, bootstyle="light")
         summary_frame.pack(fill='both', expand=True, padx=15, pady=15)
 
-        ttk.Label(summary_frame, text="Dagelijks Tijdsoverzicht", font=('Inter', 16, 'bold'),
+        ttk.Label(summary_frame, text="Tijdsoverzicht", font=('Inter', 16, 'bold'),
                   foreground=ILIONX_DARK).pack(pady=(0, 10))
 
-        text_scroll_frame = ttk.Frame(summary_frame)
-        text_scroll_frame.pack(fill='both', expand=True)
+        notebook = ttk.Notebook(summary_frame)
+        notebook.pack(fill='both', expand=True)
 
-        summary_box = tk.Text(text_scroll_frame, wrap=tk.WORD, height=12, width=40,
-                                font=('Courier', 10), bg='#F8F9FA', fg=ILIONX_DARK,
-                                insertbackground=ILIONX_DARK, relief=tk.FLAT, bd=0, padx=10, pady=10)
+        for period in PERIODS:
+            text_scroll_frame = ttk.Frame(notebook)
+            notebook.add(text_scroll_frame, text=SUMMARY_PERIODS[period][0])
 
-        summary_scrollbar = ttk.Scrollbar(text_scroll_frame, orient=VERTICAL, command=summary_box.yview,
-                                             bootstyle="round")
-        summary_scrollbar.pack(side=RIGHT, fill=Y)
-        summary_box.configure(yscrollcommand=summary_scrollbar.set)
-        summary_box.pack(side=LEFT, fill='both', expand=True)
+            summary_box = tk.Text(text_scroll_frame, wrap=tk.WORD, height=12, width=40,
+                                    font=('Courier', 10), bg='#F8F9FA', fg=ILIONX_DARK,
+                                    insertbackground=ILIONX_DARK, relief=tk.FLAT, bd=0, padx=10, pady=10)
 
-        summary_box.insert(tk.END, summary_text)
-        summary_box.config(state=tk.DISABLED)
+            summary_scrollbar = ttk.Scrollbar(text_scroll_frame, orient=VERTICAL, command=summary_box.yview,
+                                                 bootstyle="round")
+            summary_scrollbar.pack(side=RIGHT, fill=Y)
+            summary_box.configure(yscrollcommand=summary_scrollbar.set)
+            summary_box.pack(side=LEFT, fill='both', expand=True)
+
+            summary_box.insert(tk.END, self.format_summary(period))
+            summary_box.config(state=tk.DISABLED)
 
         ttk.Button(summary_frame, text="Sluiten", command=dialog.destroy,
                    style="Action.TButton").pack(pady=(15, 0))
@@ -500,6 +600,108 @@ class TimeRegistrationApp:
         dialog.grab_set()
         self.master.wait_window(dialog)
 
+    def show_analysis_dialog(self):
+        try:
+            from analytics import analyse, format_report
+        except ImportError:
+            messagebox.showerror("Fout", "Voor de analyse is NumPy nodig (pip install numpy).")
+            return
+        from export import rows_for_store
+
+        # Like the export, the analysis reads the files on disk.
+        self.writer.flush()
+        results = queue.Queue()
+
+        def run():
+            try:
+                results.put(format_report(analyse(rows_for_store(self.store))))
+            except Exception as e:
+                results.put(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        self.status_var.set("Bezig met analyseren...")
+        self.master.after(100, self.check_analysis, results)
+
+    def check_analysis(self, results):
+        try:
+            result = results.get_nowait()
+        except queue.Empty:
+            self.master.after(100, self.check_analysis, results)
+            return
+
+        if self.current_category is None:
+            self.status_var.set("Selecteer een categorie om te starten.")
+        if isinstance(result, Exception):
+            messagebox.showerror("Fout", f"Fout bij analyseren: {result}")
+            return
+
+        dialog = ttk.Toplevel(self.master)
+        dialog.title("Analyse")
+        dialog.geometry("560x620")
+
+        frame = ttk.Frame(dialog, padding=20, bootstyle="light")
+        frame.pack(fill='both', expand=True, padx=15, pady=15)
+
+        ttk.Label(frame, text="Analyse", font=('Inter', 16, 'bold'),
+                  foreground=ILIONX_DARK).pack(pady=(0, 10))
+
+        text_frame = ttk.Frame(frame)
+        text_frame.pack(fill='both', expand=True)
+
+        report_box = tk.Text(text_frame, wrap=tk.NONE, font=('Courier', 10), bg='#F8F9FA', fg=ILIONX_DARK,
+                             relief=tk.FLAT, bd=0, padx=10, pady=10)
+        report_scrollbar = ttk.Scrollbar(text_frame, orient=VERTICAL, command=report_box.yview, bootstyle="round")
+        report_scrollbar.pack(side=RIGHT, fill=Y)
+        report_box.configure(yscrollcommand=report_scrollbar.set)
+        report_box.pack(side=LEFT, fill='both', expand=True)
+        report_box.insert(tk.END, result)
+        report_box.config(state=tk.DISABLED)
+
+        ttk.Button(frame, text="Sluiten", command=dialog.destroy,
+                   style="Action.TButton").pack(pady=(15, 0))
+
+    def show_quick_switch(self):
+        from quick_switch import QuickSwitch
+
+        QuickSwitch(self.master, self.category_index, self.start_tracking)
+
+    def show_diagnostics_dialog(self):
+        dialog = ttk.Toplevel(self.master)
+        dialog.title("Diagnose")
+        dialog.geometry("760x480")
+
+        frame = ttk.Frame(dialog, padding=15)
+        frame.pack(fill='both', expand=True)
+
+        report_box = tk.Text(frame, wrap=tk.NONE, font=('Courier', 10), bg='#F8F9FA', fg=ILIONX_DARK,
+                             relief=tk.FLAT, bd=0, padx=10, pady=10)
+        report_box.pack(fill='both', expand=True)
+
+        def refresh():
+            report_box.config(state=tk.NORMAL)
+            report_box.delete('1.0', tk.END)
+            report_box.insert(tk.END, diagnostics.report())
+            report_box.config(state=tk.DISABLED)
+
+        def save():
+            from tkinter import filedialog
+
+            path = filedialog.asksaveasfilename(parent=dialog, title="Diagnose opslaan", defaultextension='.json',
+                                                filetypes=[("JSON", '*.json')])
+            if path:
+                diagnostics.dump(path)
+
+        button_frame = ttk.Frame(frame)
+        button_frame.pack(fill='x', pady=(10, 0))
+        ttk.Button(button_frame, text="Vernieuwen", command=refresh,
+                   bootstyle="outline-primary").pack(side=LEFT)
+        ttk.Button(button_frame, text="Opslaan als JSON", command=save,
+                   bootstyle="outline-primary").pack(side=LEFT, padx=10)
+        ttk.Button(button_frame, text="Sluiten", command=dialog.destroy,
+                   style="Action.TButton").pack(side=RIGHT)
+
+        refresh()
+
 
 if __name__ == "__main__":
     def resource_path(relative_path):
@@ -510,6 +712,12 @@ if __name__ == "__main__":
 
         return os.path.join(base_path, relative_path)
 
+    # A second launch brings the running instance to the front instead of tracking alongside it.
+    if not STARTUP_REPORT and send('show') is not None:
+        sys.exit(0)
+
+    diagnostics.install()
+
     root = ttk.Window(themename="litera")
     root.geometry("720x920")
 
@@ -520,6 +728,35 @@ if __name__ == "__main__":
     except tk.TclError:
         print("WAARSCHUWING: ICO-icoon niet gevonden.")
 
-    app = TimeRegistrationApp(root)
-    root.protocol("WM_DELETE_WINDOW", lambda: [app.stop_tracking(), app.save_data(), root.destroy()])
-    root.mainloop()
\ No newline at end of file
+    control_server = None
+
+    def on_ready():
+        global control_server
+        if STARTUP_REPORT:
+            print(json.dumps(app.startup_times))
+            app.close()
+            root.destroy()
+            return
+
+        # asyncio is the slowest import of all; nothing needs it before the window is usable.
+        from control_server import ControlServer
+        control_server = ControlServer(app.control_commands(), call_soon=lambda func: root.after(0, func))
+        if control_server.start():
+            return
+        control_server = None
+        # Another instance started listening while this one was loading; hand over to it.
+        if send('show') is not None:
+            app.stop_tracking()
+            app.close()
+            root.destroy()
+
+    def on_close():
+        if control_server is not None:
+            control_server.stop()
+        app.stop_tracking()
+        app.close()
+        root.destroy()
+
+    app = TimeRegistrationApp(root, on_ready=on_ready)
+    root.protocol("WM_DELETE_WINDOW", on_close)
+    root.mainloop()
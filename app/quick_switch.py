@@ -0,0 +1,76 @@
+import time
+import tkinter as tk
+import ttkbootstrap as ttk
+
+from diagnostics import diagnostics
+
+PALETTE_WIDTH = 460
+VISIBLE_RESULTS = 10
+
+
+class QuickSwitch:
+    # Ctrl+K palette: type part of a category, pick it with the arrow keys and Enter starts it.
+    # Matching is done by the CategoryIndex the app keeps up to date; the palette only shows it.
+
+    def __init__(self, master, index, on_select):
+        self.index = index
+        self.on_select = on_select
+        self.matches = []
+
+        self.dialog = ttk.Toplevel(master)
+        self.dialog.title("Snel wisselen")
+        self.dialog.transient(master)
+        master.update_idletasks()
+        x = master.winfo_x() + (master.winfo_width() - PALETTE_WIDTH) // 2
+        y = master.winfo_y() + 120
+        self.dialog.geometry(f"{PALETTE_WIDTH}x300+{x}+{y}")
+
+        frame = ttk.Frame(self.dialog, padding=10)
+        frame.pack(fill='both', expand=True)
+
+        self.query_var = tk.StringVar()
+        entry = ttk.Entry(frame, textvariable=self.query_var, font=('Inter', 12))
+        entry.pack(fill='x')
+
+        self.listbox = tk.Listbox(frame, height=VISIBLE_RESULTS, font=('Inter', 11), activestyle='none',
+                                  selectmode=tk.SINGLE, exportselection=False)
+        self.listbox.pack(fill='both', expand=True, pady=(8, 0))
+        self.listbox.bind('<Double-Button-1>', self.choose)
+
+        self.query_var.trace_add('write', self.update_matches)
+        entry.bind('<Return>', self.choose)
+        entry.bind('<Down>', lambda event: self.move(1))
+        entry.bind('<Up>', lambda event: self.move(-1))
+        self.dialog.bind('<Escape>', lambda event: self.dialog.destroy())
+
+        self.update_matches()
+        entry.focus_set()
+
+    def update_matches(self, *args):
+        start = time.perf_counter() if diagnostics.enabled else None
+        self.matches = self.index.search(self.query_var.get(), VISIBLE_RESULTS)
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *self.matches)
+        if self.matches:
+            self.listbox.selection_set(0)
+        if start is not None:
+            diagnostics.record('quick_switch.keystroke', (time.perf_counter() - start) * 1000)
+
+    def move(self, step):
+        if not self.matches:
+            return 'break'
+        selection = self.listbox.curselection()
+        position = (selection[0] + step) % len(self.matches) if selection else 0
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(position)
+        self.listbox.see(position)
+        return 'break'
+
+    def choose(self, event=None):
+        selection = self.listbox.curselection()
+        if not selection:
+            return 'break'
+        category = self.matches[selection[0]]
+        self.dialog.destroy()
+        self.on_select(category)
+        return 'break'
@@ -0,0 +1,144 @@
+import json
+import os
+import zlib
+from datetime import date as Date, datetime, timedelta
+
+from history import period_keys, record_to_json
+
+ARCHIVE_FILE = '../time_registration_archive.jsonl.gz'
+
+# TIME_TRACKER_RETENTION="<detail months>,<monthly months>", or "off" to keep everything.
+RETENTION_SETTING = os.environ.get('TIME_TRACKER_RETENTION', '12,36')
+DETAIL_MONTHS = 12
+MONTHLY_MONTHS = 36
+BATCH_DAYS = 92
+
+
+def month_start(day, months_back):
+    month_index = day.year * 12 + day.month - 1 - months_back
+    return Date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class RetentionPolicy:
+    # Keeps full detail (day totals and intervals) for detail_months, then per-category month
+    # totals up to monthly_months, then only year totals. The totals are the rollups, which
+    # already hold every period; retention only drops what is older than the policy allows.
+    # Detail is archived a batch of at most batch_days at a time, so one step stays short
+    # however far behind a history is.
+
+    def __init__(self, detail_months=DETAIL_MONTHS, monthly_months=MONTHLY_MONTHS, batch_days=BATCH_DAYS):
+        self.detail_months = detail_months
+        self.monthly_months = max(monthly_months, detail_months)
+        self.batch_days = batch_days
+
+    def apply(self, history, today=None):
+        today = today or datetime.now().date()
+        detail_cutoff = month_start(today, self.detail_months).isoformat()
+        # Month totals go a whole year at a time, so no year is left half in months.
+        monthly_cutoff = f"{month_start(today, self.monthly_months).year}-01"
+
+        history.rollups.drop_before('week', period_keys(detail_cutoff)['week'])
+        history.rollups.drop_before('month', monthly_cutoff)
+
+        first = history.first_date()
+        if first is None or first >= detail_cutoff:
+            return [], False
+        batch_end = min(detail_cutoff, (Date.fromisoformat(first) + timedelta(days=self.batch_days)).isoformat())
+        return history.pop_detail_before(batch_end), batch_end < detail_cutoff
+
+
+def policy_from_setting(setting=RETENTION_SETTING):
+    if not setting or setting.lower() == 'off':
+        return None
+    try:
+        detail_months, monthly_months = (int(part) for part in setting.split(','))
+    except ValueError:
+        print(f"Invalid TIME_TRACKER_RETENTION {setting!r}, using {DETAIL_MONTHS},{MONTHLY_MONTHS}")
+        return RetentionPolicy()
+    return RetentionPolicy(detail_months, monthly_months)
+
+
+def archive_text(records):
+    # Same line format as the day-index file: category ids, resolved with the snapshot's names.
+    return ''.join(json.dumps(record_to_json(record)) + '\n' for record in records)
+
+
+def archive_members(path):
+    # Yields the end offset and text of every complete gzip member. Every archive step
+    # appends one member; a crash halfway leaves a torn one at the end, which is never read.
+    position = 0
+    parts = []
+    decompressor = zlib.decompressobj(31)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 16)
+            if not chunk:
+                return
+            while chunk:
+                try:
+                    parts.append(decompressor.decompress(chunk))
+                except zlib.error as e:
+                    print(f"Error reading {path}, ignoring the rest: {e}")
+                    return
+                if not decompressor.eof:
+                    position += len(chunk)
+                    break
+                position += len(chunk) - len(decompressor.unused_data)
+                yield position, b''.join(parts).decode('utf-8')
+                parts = []
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(31)
+
+
+def repair_archive(path):
+    # Cuts off a torn last member, like the torn last line of the journal, so the next
+    # append doesn't end up behind it.
+    if not os.path.exists(path):
+        return
+    valid_end = 0
+    for valid_end, _ in archive_members(path):
+        pass
+    if valid_end < os.path.getsize(path):
+        print(f"Truncating damaged end of {path}")
+        os.truncate(path, valid_end)
+
+
+def archive_lines(path):
+    for _, text in archive_members(path):
+        yield from text.splitlines(True)
+
+
+def read_archive(path):
+    # A crash between archiving a batch and writing the snapshot archives those days again on
+    # the next step; the later copy of a day wins. The first pass only collects positions.
+    if not os.path.exists(path):
+        return
+    last_line = {}
+    for number, line in enumerate(archive_lines(path)):
+        try:
+            last_line[json.loads(line)['date']] = number
+        except (json.JSONDecodeError, KeyError, TypeError):
+            continue
+    wanted = set(last_line.values())
+    for number, line in enumerate(archive_lines(path)):
+        if number in wanted:
+            yield json.loads(line)
+
+
+def archive_rows(path=ARCHIVE_FILE, names=None, rename=None):
+    # Same rows as the export: (date, category, start, end, seconds). `names` is the current
+    # category table, so a category renamed after it was archived shows up under its new name;
+    # `rename` applies the renames logged in the journal since that table was written.
+    rename = rename or (lambda name: name)
+    for record in read_archive(path):
+        # Records archived before ids were used carry names and a days dict instead of pairs.
+        if isinstance(record['days'], dict):
+            days, name = record['days'].items(), rename
+        else:
+            days, name = record['days'], lambda category: rename(names[int(category)] if names else category)
+        for category, seconds in days:
+            yield record['date'], name(category), None, None, seconds
+        for category, intervals in record['intervals'].items():
+            category = name(category)
+            for start, end in intervals:
+                yield record['date'], category, start, end, end - start
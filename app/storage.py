@@ -0,0 +1,691 @@
+import gzip
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+
+from history import (DATE_FORMAT, DAY_CACHE_SIZE, CategoryTable, History, LazyHistory, Rollups, add_to, day_bounds,
+                     period_range, record_to_json, split_by_day)
+from retention import ARCHIVE_FILE, archive_rows, archive_text, policy_from_setting, repair_archive
+
+DATA_FILE = '../time_registration_data.json'
+JOURNAL_FILE = '../time_registration_journal.jsonl'
+DAY_INDEX_FILE = '../time_registration_days.jsonl'
+SQLITE_FILE = '../time_registration.sqlite3'
+
+# 'json' keeps the whole history in memory; 'day-index' reads days from DAY_INDEX_FILE on demand;
+# 'sqlite' keeps everything in SQLITE_FILE and queries it.
+STORAGE_MODE = os.environ.get('TIME_TRACKER_STORAGE', 'json')
+
+COMPACT_EVERY = 500
+WRITER_QUEUE_SIZE = 256
+WRITER_LINGER = 0.05
+SQLITE_TIMEOUT = 5.0
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    start REAL,
+    end REAL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_date_category ON entries (date, category, seconds);
+CREATE INDEX IF NOT EXISTS entries_category_date ON entries (category, date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+INSERT_ENTRY = "INSERT INTO entries (date, category, start, end, seconds) VALUES (?, ?, ?, ?, ?)"
+
+
+def apply_record(history, record):
+    if 'rename' in record:
+        history.rename_category(*record['rename'])
+    elif 'date' in record:
+        # Journals written before intervals were recorded only carry a duration.
+        history.add_day_total(record['date'], record['category'], float(record['duration']))
+    else:
+        history.add_interval(record['category'], float(record['start']), float(record['end']))
+
+
+def write_atomic(path, text, fsync=True):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def append_text(path, text, fsync=False):
+    if path.endswith('.gz'):
+        # Every append is a gzip member of its own; readers see the members as one stream.
+        with open(path, 'ab') as f:
+            f.write(gzip.compress(text.encode('utf-8')))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        return
+
+    # newline='' keeps byte offsets into the file equal to the lengths we computed.
+    with open(path, 'a', newline='') as f:
+        f.write(text)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def write_record(path, data, fsync=False):
+    # Writes a fixed-size record over the start of the file, in place.
+    with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+_writer_connections = threading.local()
+
+
+def writer_connection(path, fsync):
+    # sqlite3 connections belong to the thread that opened them, so every thread that runs
+    # writes keeps its own.
+    connections = _writer_connections.__dict__.setdefault('connections', {})
+    if path not in connections:
+        connections[path] = connect_sqlite(path, fsync)
+    return connections[path]
+
+
+def close_writer_connections():
+    for connection in _writer_connections.__dict__.pop('connections', {}).values():
+        connection.close()
+
+
+def run_write(op, fsync=True):
+    kind, path, text = op
+    if callable(text):
+        text = text()
+    if kind == 'append':
+        append_text(path, text, fsync)
+    elif kind == 'replace':
+        write_atomic(path, text, fsync)
+    elif kind == 'record':
+        write_record(path, text, fsync)
+    elif kind == 'remove':
+        if os.path.exists(path):
+            os.remove(path)
+    elif kind == 'snapshot':
+        # The journal is only restarted once the snapshot it was folded into is on disk; if the
+        # snapshot fails, the old snapshot and journal stay a matching pair.
+        snapshot_text, journal_file, journal_header = text
+        write_atomic(path, snapshot_text() if callable(snapshot_text) else snapshot_text, fsync)
+        write_atomic(journal_file, journal_header, fsync)
+    elif kind == 'sql':
+        # A list of (query, rows); everything coalesced into one op is one transaction.
+        try:
+            with writer_connection(path, fsync) as connection:
+                for query, rows in text:
+                    connection.executemany(query, rows)
+        except sqlite3.Error as e:
+            raise IOError(str(e))
+
+
+def coalesce(ops):
+    # A replace, record or remove makes every earlier write to the same path redundant. What is left
+    # keeps its order, and runs of appends (or SQL statements) to one file are merged into a
+    # single write.
+    last_overwrite = {}
+    for i, (kind, path, _) in enumerate(ops):
+        if kind not in ('append', 'sql'):
+            last_overwrite[path] = i
+
+    merged = []
+    for i, (kind, path, text) in enumerate(ops):
+        if i < last_overwrite.get(path, -1):
+            continue
+        if kind in ('append', 'sql') and merged and merged[-1][0] == kind and merged[-1][1] == path:
+            merged[-1] = (kind, path, merged[-1][2] + text)
+        else:
+            merged.append((kind, path, text))
+    return merged
+
+
+class BackgroundWriter:
+    def __init__(self, max_pending=WRITER_QUEUE_SIZE, fsync=False, linger=WRITER_LINGER):
+        self.fsync = fsync
+        self.linger = linger
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name='BackgroundWriter', daemon=True)
+        self.thread.start()
+
+    def submit(self, op):
+        self.queue.put(op)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            if self.linger and batch[0] is not None:
+                time.sleep(self.linger)
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for op in coalesce([op for op in batch if op is not None]):
+                try:
+                    run_write(op, self.fsync)
+                except IOError as e:
+                    print(f"Error writing {op[1]}: {e}")
+
+            if None in batch:
+                close_writer_connections()
+            for _ in batch:
+                self.queue.task_done()
+            if None in batch:
+                return
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+def load_legacy(legacy_file, journal_file, archive_file):
+    # The JSON history plus the detail the retention policy moved to the archive, as export
+    # rows. Migrating only the history would lose every archived day.
+    store = JournalStore(legacy_file, journal_file)
+    legacy = store.load()
+    archived = archive_rows(archive_file, legacy.table.names) if archive_file else iter(())
+    return legacy, store.generation, chain(archived, legacy.entries())
+
+
+def load_snapshot(path):
+    if not os.path.exists(path):
+        return History(), 0, None
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return History(), 0, None
+
+    if not isinstance(data, dict):
+        return History(), 0, None
+    if not isinstance(data.get('days'), dict):
+        # Pre-journal files are a bare {date: {category: seconds}} dict.
+        return History.from_json({'days': data}), 0, None
+    return History.from_json(data), data.get('generation', 0), data.get('user')
+
+
+class JournalStore:
+    # The snapshot holds the compacted history, the journal holds one stop event per line
+    # written since that snapshot. Both carry a generation number so a crash between writing
+    # a new snapshot and starting a new journal never replays the same records twice.
+
+    def __init__(self, data_file, journal_file, compact_every=COMPACT_EVERY, writer=None, user_id=None,
+                 retention=None, archive_file=None):
+        self.data_file = data_file
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.writer = writer
+        self.user_id = user_id
+        self.retention = retention
+        self.archive_file = archive_file
+        self.generation = 0
+        self.pending = 0
+        self.journal_ready = False
+
+    def new_history(self):
+        return History()
+
+    def load(self):
+        history = self._load_snapshot()
+        self.pending = self._replay_journal(history)
+        if self.archive_file and self.retention is not None:
+            try:
+                repair_archive(self.archive_file)
+            except IOError as e:
+                print(f"Error checking {self.archive_file}: {e}")
+        return history
+
+    def _load_snapshot(self):
+        history, self.generation, _ = load_snapshot(self.data_file)
+        return history
+
+    def _replay_journal(self, history):
+        self.journal_ready = False
+        if not os.path.exists(self.journal_file):
+            return 0
+
+        count = 0
+        valid_end = 0
+        stale = False
+        try:
+            with open(self.journal_file, 'rb') as f:
+                header = f.readline()
+                try:
+                    generation = json.loads(header)['generation']
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    generation = None
+                if generation != self.generation:
+                    stale = True
+                    return 0
+
+                self.journal_ready = True
+                valid_end = len(header)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    valid_end += len(line)
+                    try:
+                        apply_record(history, json.loads(line))
+                        count += 1
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                        continue
+
+            # Drop a torn last record so the next append starts on a clean line.
+            if valid_end < os.path.getsize(self.journal_file):
+                os.truncate(self.journal_file, valid_end)
+        except IOError as e:
+            print(f"Error reading journal: {e}")
+        finally:
+            # Records from an older generation are already part of the snapshot.
+            if stale:
+                self._write(self._journal_header())
+        return count
+
+    def _write(self, op):
+        if self.writer is not None:
+            self.writer.submit(op)
+        else:
+            run_write(op)
+
+    def _journal_header(self):
+        self.journal_ready = True
+        return 'replace', self.journal_file, json.dumps({'generation': self.generation}) + '\n'
+
+    def _snapshot(self, path, text, generation):
+        self.journal_ready = True
+        return 'snapshot', path, (text, self.journal_file, json.dumps({'generation': generation}) + '\n')
+
+    def append(self, category, start, end):
+        return self._append_record({'category': category, 'start': start, 'end': end})
+
+    def log_rename(self, old, new):
+        return self._append_record({'rename': [old, new]})
+
+    def _append_record(self, record):
+        try:
+            if not self.journal_ready:
+                self._write(self._journal_header())
+            self._write(('append', self.journal_file, json.dumps(record) + '\n'))
+        except IOError as e:
+            print(f"Error appending to journal: {e}")
+            return False
+
+        self.pending += 1
+        return self.pending >= self.compact_every
+
+    def compact(self, history):
+        # Copy on the calling thread, serialize on the writer thread.
+        snapshot = history.copy()
+        header = {'generation': self.generation + 1, 'user': self.user_id}
+        try:
+            # Only raises without a writer; with one, a failed snapshot leaves the journal alone.
+            self._write(self._snapshot(self.data_file, lambda: json.dumps({**header, **snapshot.to_json()}, indent=4),
+                                       header['generation']))
+            self.generation = header['generation']
+            self.pending = 0
+        except IOError as e:
+            print(f"Error saving data: {e}")
+
+    def apply_retention(self, history):
+        # One step of the retention policy. The archive append is queued before the snapshot
+        # that no longer holds those days, so the detail is never only in memory. Returns
+        # True while older detail is left for another step.
+        if self.retention is None:
+            return False
+        records, more = self.retention.apply(history)
+        if records:
+            self._write(('append', self.archive_file, archive_text(records)))
+            self.compact(history)
+        return more
+
+    def reset(self):
+        self._write(('remove', self.data_file, None))
+        self._write(('remove', self.journal_file, None))
+        if self.archive_file:
+            self._write(('remove', self.archive_file, None))
+        self.generation = 0
+        self.pending = 0
+        self.journal_ready = False
+
+
+class DayFile:
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}
+        self.named = False
+
+    def read(self, date):
+        position = self.offsets.get(date)
+        if position is None:
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(position[0])
+                return json.loads(f.read(position[1]))
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Error reading {date} from {self.path}: {e}")
+            return None
+
+    def scan(self):
+        self.offsets = {}
+        names = None
+        position = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if line.endswith(b'\n'):
+                    try:
+                        data = json.loads(line)
+                        if 'categories' in data:
+                            names = data['categories']
+                        else:
+                            self.offsets[data['date']] = [position, len(line)]
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        pass
+                position += len(line)
+        return names
+
+
+class DayIndexStore(JournalStore):
+    # Storage mode for long histories: data_file holds one JSON line per day and the .idx
+    # file maps each date to the byte offset of its newest line. Startup reads the index and
+    # today's line only. Compaction appends the changed days and rewrites the index; the
+    # lines they replace are left behind in the file. The category names go into the index
+    # and, whenever they change, into a line of the data file, so a lost index can be rebuilt.
+
+    def __init__(self, data_file, journal_file, legacy_file=None, cache_size=DAY_CACHE_SIZE, **kwargs):
+        super().__init__(data_file, journal_file, **kwargs)
+        self.index_file = f"{data_file}.idx"
+        self.legacy_file = legacy_file
+        self.cache_size = cache_size
+        self.day_file = DayFile(data_file)
+        self.data_size = 0
+        self.written_names = []
+
+    def new_history(self, table=None, rollups=None):
+        return LazyHistory(self.day_file, table, rollups, self.cache_size)
+
+    def _load_snapshot(self):
+        self.generation = 0
+        self.day_file.offsets = {}
+        self.day_file.named = False
+        self.data_size = 0
+        self.written_names = []
+        self.rollups = None
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    index = json.load(f)
+                self.generation = index['generation']
+                self.day_file.offsets = index['offsets']
+                self.day_file.named = 'categories' not in index
+                self.written_names = index.get('categories', [])
+                if 'rollups' in index:
+                    self.rollups = Rollups.from_json(index['rollups'])
+            except (json.JSONDecodeError, IOError, KeyError, TypeError) as e:
+                print(f"Error reading {self.index_file}, rebuilding it: {e}")
+                self._rebuild_index()
+        elif os.path.exists(self.data_file):
+            # The day file is the data; a lost index is rebuilt from it, never re-migrated.
+            print(f"{self.index_file} is missing, rebuilding it")
+            self._rebuild_index()
+        else:
+            if self.legacy_file and os.path.exists(self.legacy_file):
+                history = self._migrate()
+            else:
+                history = self.new_history()
+            self.rollups = history.rollups
+            return history
+
+        if os.path.exists(self.data_file):
+            self.data_size = os.path.getsize(self.data_file)
+        history = self.new_history(CategoryTable(self.written_names), self.rollups)
+        history.record(datetime.now().strftime(DATE_FORMAT))
+        return history
+
+    def load(self):
+        history = super().load()
+        if self.day_file.named:
+            # Day files from before category ids: rewrite every day once in the id format.
+            for date in list(self.day_file.offsets):
+                history._edit(date)
+            self.day_file.named = False
+            self.compact(history)
+        if self.rollups is None:
+            history.rebuild_rollups()
+            self.rollups = history.rollups
+            self.compact(history)
+        return history
+
+    def _rebuild_index(self):
+        if os.path.exists(self.data_file):
+            names = self.day_file.scan()
+            # Only day files from before category ids have no names line.
+            self.day_file.named = names is None and bool(self.day_file.offsets)
+            self.written_names = names or []
+        # Keep the journal: its records were written after the last index that made it to disk.
+        try:
+            with open(self.journal_file, 'rb') as f:
+                self.generation = json.loads(f.readline())['generation']
+        except (json.JSONDecodeError, IOError, KeyError, TypeError):
+            pass
+
+    def _migrate(self):
+        legacy, self.generation, rows = load_legacy(self.legacy_file, self.journal_file, self.archive_file)
+
+        history = self.new_history(legacy.table.copy())
+        for date, category, start, end, seconds in rows:
+            if start is None:
+                history.add_day_total(date, category, seconds)
+            else:
+                history.add_interval(category, start, end)
+        self.compact(history)
+        return history
+
+    def compact(self, history):
+        lines = []
+        names = list(history.table.names)
+        if names != self.written_names:
+            lines.append(json.dumps({'categories': names}) + '\n')
+            self.data_size += len(lines[-1])
+            self.written_names = names
+        for record in history.take_changed():
+            line = json.dumps(record_to_json(record)) + '\n'
+            self.day_file.offsets[record['date']] = [self.data_size, len(line)]
+            self.data_size += len(line)
+            lines.append(line)
+
+        offsets = dict(self.day_file.offsets)
+        rollups = history.rollups.copy()
+        generation = self.generation + 1
+        try:
+            if lines:
+                self._write(('append', self.data_file, ''.join(lines)))
+            self._write(self._snapshot(self.index_file,
+                                       lambda: json.dumps({'generation': generation, 'user': self.user_id,
+                                                           'categories': names, 'offsets': offsets,
+                                                           'rollups': rollups.to_json()}),
+                                       generation))
+            self.generation = generation
+            self.pending = 0
+        except IOError as e:
+            print(f"Error saving data: {e}")
+
+    def reset(self):
+        self._write(('remove', self.index_file, None))
+        if self.legacy_file:
+            # Otherwise the next launch would migrate the deleted history back in.
+            self._write(('remove', self.legacy_file, None))
+        super().reset()
+        self.day_file.offsets = {}
+        self.data_size = 0
+        self.written_names = []
+
+
+def connect_sqlite(path, fsync=False, read_only=False):
+    # WAL lets readers work from the last commit while a writer appends, so reports and a
+    # second instance never wait for the tracker or make it wait.
+    if read_only:
+        connection = sqlite3.connect(f"{Path(path).absolute().as_uri()}?mode=ro", uri=True, timeout=SQLITE_TIMEOUT)
+    else:
+        connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        connection.executescript(SQLITE_SCHEMA)
+    return connection
+
+
+class SqliteHistory:
+    # Same queries as History, answered from the entries table through its indexes. With a
+    # writer, changes are committed on its thread, one transaction per batch; a query first
+    # waits for the queued changes, so it always sees them.
+
+    def __init__(self, connection, writer=None, path=None):
+        self.connection = connection
+        self.writer = writer
+        self.path = path
+
+    def _execute(self, query, params):
+        if self.writer is not None:
+            self.writer.flush()
+        return self.connection.execute(query, params)
+
+    def _totals(self, query, params):
+        return {category: seconds for category, seconds in self._execute(query, params)}
+
+    def _write(self, query, rows):
+        if self.writer is not None:
+            self.writer.submit(('sql', self.path, [(query, rows)]))
+            return
+        try:
+            with self.connection:
+                self.connection.executemany(query, rows)
+        except sqlite3.Error as e:
+            print(f"Error writing to database: {e}")
+
+    def add_interval(self, category, start, end):
+        self._write(INSERT_ENTRY, [(date, category, piece_start, piece_end, piece_end - piece_start)
+                                   for date, piece_start, piece_end in split_by_day(start, end)])
+
+    def add_day_total(self, date, category, seconds):
+        self._write(INSERT_ENTRY, [(date, category, None, None, seconds)])
+
+    def rename_category(self, old, new):
+        self._write("UPDATE entries SET category = ? WHERE category = ?", [(new, old)])
+
+    def day_totals(self, date):
+        return self._totals("SELECT category, SUM(seconds) FROM entries WHERE date = ? GROUP BY category", (date,))
+
+    def period_totals(self, period, key):
+        return self._totals("SELECT category, SUM(seconds) FROM entries WHERE date BETWEEN ? AND ? GROUP BY category",
+                            period_range(period, key))
+
+    def totals_between(self, t1, t2):
+        totals = {}
+        first = datetime.fromtimestamp(t1).strftime(DATE_FORMAT)
+        last = datetime.fromtimestamp(t2).strftime(DATE_FORMAT)
+        rows = self._execute("SELECT date, category, start, end, seconds FROM entries "
+                             "WHERE date BETWEEN ? AND ?", (first, last))
+        for date, category, start, end, seconds in rows:
+            if start is None:
+                day_start, day_end = day_bounds(date)
+                if t1 <= day_start and day_end <= t2:
+                    add_to(totals, category, seconds)
+            elif min(end, t2) > max(start, t1):
+                add_to(totals, category, min(end, t2) - max(start, t1))
+        return totals
+
+
+class SqliteStore:
+    # Storage mode for long histories and shared use: one row per booking, clipped at
+    # midnight, indexed on (date, category). There is no journal and nothing to compact;
+    # changes go to the writer thread and are committed a batch at a time. The JSON history
+    # is copied in once, in a single transaction, the first time the database is opened.
+
+    def __init__(self, data_file, legacy_file=None, journal_file=None, writer=None, user_id=None, archive_file=None):
+        self.data_file = data_file
+        self.legacy_file = legacy_file
+        self.journal_file = journal_file
+        self.archive_file = archive_file
+        self.writer = writer
+        self.fsync = writer.fsync if writer is not None else True
+        self.user_id = user_id
+        self.connection = None
+        self.pending = 0
+
+    def new_history(self):
+        return SqliteHistory(self.connection, self.writer, self.data_file)
+
+    def load(self):
+        if self.connection is None:
+            self.connection = connect_sqlite(self.data_file, self.fsync)
+        if self.connection.execute("SELECT value FROM meta WHERE key = 'created'").fetchone() is None:
+            self._migrate()
+        return self.new_history()
+
+    def _migrate(self):
+        entries = []
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            entries = load_legacy(self.legacy_file, self.journal_file, self.archive_file)[2]
+        try:
+            with self.connection:
+                self.connection.executemany(INSERT_ENTRY, entries)
+                self.connection.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                            [('created', datetime.now().isoformat()), ('user', self.user_id)])
+        except sqlite3.Error as e:
+            print(f"Error migrating {self.legacy_file}: {e}")
+
+    def append(self, category, start, end):
+        return False
+
+    def log_rename(self, old, new):
+        return False
+
+    def compact(self, history):
+        pass
+
+    def apply_retention(self, history):
+        return False
+
+    def reset(self):
+        if self.writer is not None:
+            self.writer.flush()
+        try:
+            with self.connection:
+                self.connection.execute("DELETE FROM entries")
+        except sqlite3.Error as e:
+            raise IOError(str(e))
+
+
+def open_store(mode=None, writer=None, user_id=None):
+    mode = mode or STORAGE_MODE
+    if mode == 'day-index':
+        return DayIndexStore(DAY_INDEX_FILE, JOURNAL_FILE, legacy_file=DATA_FILE, writer=writer, user_id=user_id,
+                             archive_file=ARCHIVE_FILE)
+    if mode == 'sqlite':
+        return SqliteStore(SQLITE_FILE, legacy_file=DATA_FILE, journal_file=JOURNAL_FILE, writer=writer,
+                           user_id=user_id, archive_file=ARCHIVE_FILE)
+    return JournalStore(DATA_FILE, JOURNAL_FILE, writer=writer, user_id=user_id, retention=policy_from_setting(),
+                        archive_file=ARCHIVE_FILE)
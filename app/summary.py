@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from history import DATE_FORMAT, period_keys
+
+SUMMARY_PERIODS = {
+    'day': ("Dag", "Dagelijks Tijdsoverzicht", "Er is vandaag geen tijd geregistreerd."),
+    'week': ("Week", "Wekelijks Tijdsoverzicht", "Er is deze week geen tijd geregistreerd."),
+    'month': ("Maand", "Maandelijks Tijdsoverzicht", "Er is deze maand geen tijd geregistreerd."),
+    'year': ("Jaar", "Jaarlijks Tijdsoverzicht", "Er is dit jaar geen tijd geregistreerd."),
+}
+
+
+def format_time(seconds):
+    td = timedelta(seconds=int(seconds))
+    total_seconds = int(td.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def format_summary(history, period='day', category_ranks=None, today=None):
+    _, title, empty_message = SUMMARY_PERIODS[period]
+    today = today or datetime.now().strftime(DATE_FORMAT)
+    key = today if period == 'day' else period_keys(today)[period]
+
+    period_data = history.period_totals(period, key)
+    summary_lines = [f"{title}: {key}\n",
+                     "--------------------------------------------------"]
+
+    total_time_seconds = 0
+
+    category_ranks = category_ranks or {}
+
+    sorted_data = sorted(period_data.items(), key=lambda item: category_ranks.get(item[0], 1000))
+
+    for category, seconds in sorted_data:
+        if seconds > 0:
+            formatted_duration = format_time(seconds)
+            summary_lines.append(f"{category:<30}: {formatted_duration}")
+            total_time_seconds += seconds
+
+    if total_time_seconds == 0:
+        summary_lines.append(f"\n{empty_message}")
+        return "\n".join(summary_lines)
+
+    summary_lines.append("--------------------------------------------------")
+    summary_lines.append(f"TOTALE GEREGISTREERDE TIJD: {format_time(total_time_seconds)}")
+
+    return "\n".join(summary_lines)
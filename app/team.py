@@ -0,0 +1,221 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from export import JsonStream, read_journal
+from history import DATE_FORMAT, PERIODS, add_to
+from storage import apply_record, load_snapshot, write_atomic
+
+CACHE_FILE = '.team_cache.json'
+DEFAULT_DATA_NAME = 'time_registration_data'
+DEFAULT_JOURNAL_NAME = 'time_registration_journal.jsonl'
+
+
+def find_data_files(directory, exclude=()):
+    excluded = {os.path.abspath(path) for path in exclude}
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith('.json') and name != CACHE_FILE and os.path.abspath(path) not in excluded:
+                paths.append(path)
+    return sorted(paths)
+
+
+def is_date(text):
+    try:
+        datetime.strptime(text, DATE_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+
+def is_data_file(path):
+    # Snapshots have days and a generation, pre-journal files are a bare {date: {...}} dict;
+    # any other .json that ended up in the directory is not a user's history.
+    if os.path.basename(path) == f"{DEFAULT_DATA_NAME}.json":
+        return True
+    with open(path, 'r') as f:
+        stream = JsonStream(f)
+        if stream.peek() != '{':
+            return False
+        for position, key in enumerate(stream.members()):
+            if key in ('days', 'generation') or (position == 0 and is_date(key)):
+                return True
+            stream.value()
+    return False
+
+
+def journal_for_path(path):
+    # <user>/time_registration_data.json goes with <user>/time_registration_journal.jsonl,
+    # <user>.json with <user>.jsonl.
+    if os.path.splitext(os.path.basename(path))[0] == DEFAULT_DATA_NAME:
+        return os.path.join(os.path.dirname(path), DEFAULT_JOURNAL_NAME)
+    return f"{os.path.splitext(path)[0]}.jsonl"
+
+
+def source_files(path):
+    journal = journal_for_path(path)
+    return [path, journal] if os.path.exists(journal) else [path]
+
+
+def file_digest(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_stamp(paths):
+    return [[stat.st_mtime_ns, stat.st_size] for stat in map(os.stat, paths)]
+
+
+def load_history(path):
+    # Read only: unlike JournalStore.load this never rewrites a stale or torn journal.
+    history, generation, user = load_snapshot(path)
+    journal_generation, records = read_journal(journal_for_path(path))
+    if journal_generation == generation:
+        for record in records:
+            try:
+                apply_record(history, record)
+            except (KeyError, TypeError, ValueError):
+                continue
+    return history, user
+
+
+def user_for_path(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem == DEFAULT_DATA_NAME:
+        # Files collected as <user>/time_registration_data.json
+        return os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return stem
+
+
+def summarize_file(path, period, known_digest=None):
+    # Runs in a worker process. When the contents match the cached digest the file is not parsed.
+    # Anything that goes wrong is reported for this file only, so one stray .json in the
+    # directory doesn't stop the whole run.
+    try:
+        if not is_data_file(path):
+            return None, None, "geen tijdregistratiebestand"
+        digest = file_digest(source_files(path))
+        if digest == known_digest:
+            return digest, None, None
+
+        history, user = load_history(path)
+        return digest, {
+            'user': user or user_for_path(path),
+            'totals': dict(history.period_items(period)),
+        }, None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+
+def _summarize(args):
+    return summarize_file(*args)
+
+
+def reduce_results(results):
+    users = {}
+    team = {}
+    for result in results:
+        user_totals = users.setdefault(result['user'], {})
+        for key, totals in result['totals'].items():
+            for category, seconds in totals.items():
+                add_to(user_totals.setdefault(key, {}), category, seconds)
+                add_to(team.setdefault(key, {}), category, seconds)
+    return {'users': users, 'team': team}
+
+
+def read_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+            if isinstance(cache, dict):
+                return cache
+    except (json.JSONDecodeError, IOError):
+        pass
+    return {}
+
+
+def aggregate(directory, period='week', workers=None, cache_path=None, exclude=()):
+    if cache_path is None:
+        cache_path = os.path.join(directory, CACHE_FILE)
+    cache = read_cache(cache_path) if cache_path else {}
+    new_cache = {}
+    results = []
+    skipped = {}
+    todo = []
+
+    for path in find_data_files(directory, [*exclude, cache_path] if cache_path else exclude):
+        stamp = source_stamp(source_files(path))
+        cache_key = f"{period}:{os.path.relpath(path, directory)}"
+        entry = cache.get(cache_key)
+        if entry and entry.get('stamp') == stamp:
+            new_cache[cache_key] = entry
+            results.append(entry['result'])
+        else:
+            todo.append((cache_key, stamp, path, entry))
+
+    jobs = [(path, period, entry['digest'] if entry else None) for _, _, path, entry in todo]
+    if len(jobs) > 1:
+        chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            summaries = list(pool.map(_summarize, jobs, chunksize=chunksize))
+    else:
+        summaries = [_summarize(job) for job in jobs]
+
+    for (cache_key, stamp, path, entry), (digest, result, error) in zip(todo, summaries):
+        if error is not None:
+            skipped[os.path.relpath(path, directory)] = error
+            continue
+        if result is None:
+            result = entry['result']
+        new_cache[cache_key] = {'stamp': stamp, 'digest': digest, 'result': result}
+        results.append(result)
+
+    if cache_path:
+        # Keep entries for the other periods; drop files that are gone.
+        for cache_key, entry in cache.items():
+            if not cache_key.startswith(f"{period}:"):
+                new_cache.setdefault(cache_key, entry)
+        try:
+            write_atomic(cache_path, json.dumps(new_cache))
+        except IOError as e:
+            print(f"Error writing cache {cache_path}: {e}", file=sys.stderr)
+
+    report = reduce_results(results)
+    report['period'] = period
+    report['skipped'] = skipped
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tel de tijdregistraties van een team bij elkaar op.")
+    parser.add_argument('directory', help="map met de time_registration_data.json bestanden (en journals) van het team")
+    parser.add_argument('--period', choices=PERIODS, default='week')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', help="schrijf het resultaat naar dit bestand in plaats van stdout")
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args(argv)
+
+    report = aggregate(args.directory, args.period, args.workers, cache_path='' if args.no_cache else None,
+                       exclude=[args.output] if args.output else ())
+    for path, error in report['skipped'].items():
+        print(f"Overgeslagen: {path} ({error})", file=sys.stderr)
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
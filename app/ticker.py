@@ -0,0 +1,52 @@
+import time
+
+# Fire a little after each boundary so the whole second has certainly passed.
+TICK_SLACK_MS = 5
+
+
+class Ticker:
+    # Calls on_tick(elapsed) once per second of a running session. Ticks follow the session's
+    # own monotonic clock and land just after each whole second, so the shown seconds never
+    # skip or repeat. While stopped or iconified no timer is pending at all.
+
+    def __init__(self, master, on_tick):
+        self.master = master
+        self.on_tick = on_tick
+        self.started = None
+        self.pending = None
+        master.bind('<Unmap>', self._on_unmap, add='+')
+        master.bind('<Map>', self._on_map, add='+')
+
+    def elapsed(self):
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    def start(self, started=None):
+        self._cancel()
+        self.started = time.monotonic() if started is None else started
+        self._tick()
+
+    def stop(self):
+        self._cancel()
+        self.started = None
+
+    def _cancel(self):
+        if self.pending is not None:
+            self.master.after_cancel(self.pending)
+            self.pending = None
+
+    def _tick(self):
+        self.pending = None
+        if self.started is None or self.master.state() == 'iconic':
+            return
+        elapsed = self.elapsed()
+        self.on_tick(elapsed)
+        self.pending = self.master.after(1000 - int(elapsed % 1 * 1000) + TICK_SLACK_MS, self._tick)
+
+    # Map and Unmap of child widgets reach the toplevel's bindings too; only the window counts.
+    def _on_unmap(self, event):
+        if event.widget is self.master:
+            self._cancel()
+
+    def _on_map(self, event):
+        if event.widget is self.master and self.started is not None and self.pending is None:
+            self._tick()
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import control
+import control_server
+from control import send
+from control_server import ControlServer
+
+
+def fail():
+    raise RuntimeError("kapot")
+
+
+class ControlServerTest(unittest.TestCase):
+    def setUp(self):
+        # A private endpoint, so the test neither talks to nor replaces a running tool.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for module in (control, control_server):
+            for name in ('CONTROL_SOCKET', 'CONTROL_PORT_FILE'):
+                patcher = mock.patch.object(module, name, os.path.join(directory.name, name.lower()))
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+        self.server = ControlServer({'echo': lambda text: text, 'fail': fail})
+        self.assertTrue(self.server.start())
+        self.addCleanup(self.server.stop)
+
+    def test_commands_run_without_call_soon(self):
+        self.assertEqual(send('ping'), {'ok': True, 'result': 'pong'})
+        self.assertEqual(send('echo', text="hallo"), {'ok': True, 'result': "hallo"})
+        self.assertFalse(send('echo')['ok'])
+        self.assertEqual(send('missing'), {'ok': False, 'error': "Onbekend commando: missing"})
+        self.assertEqual(send('fail'), {'ok': False, 'error': "RuntimeError: kapot"})
+
+    def test_second_instance_does_not_start(self):
+        self.assertFalse(ControlServer({}).start())
+        self.assertEqual(send('ping'), {'ok': True, 'result': 'pong'})
+
+
+if __name__ == '__main__':
+    unittest.main()
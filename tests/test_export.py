@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import export
+from export import JsonStream
+
+
+def walk(stream):
+    char = stream.peek()
+    if char == '{':
+        result = {}
+        for key in stream.members():
+            result[key] = walk(stream)
+        return result
+    if char == '[':
+        result = []
+        for _ in stream.items():
+            result.append(walk(stream))
+        return result
+    return stream.value()
+
+
+DOCUMENT = {
+    'categories': ["Vergadering", "Café éè", "a \"quoted\" name"],
+    'days': {'2024-01-02': [[0, 3600.5], [1, 12345678901234]], '2024-01-03': []},
+    'intervals': {'0': [[1704186000.25, 1704189600.75]], '2': []},
+    'rollups': {},
+    'generation': 12,
+    'flags': [True, False, None, -1.5e-3],
+}
+
+
+class JsonStreamTest(unittest.TestCase):
+    def test_reads_the_document_in_any_chunk_size(self):
+        for indent in (None, 2):
+            text = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False)
+            for chunk_size in (1, 2, 3, 7, 1 << 16):
+                with mock.patch.object(export, 'CHUNK_SIZE', chunk_size):
+                    self.assertEqual(walk(JsonStream(io.StringIO(text))), DOCUMENT)
+
+    def test_skips_members_it_does_not_walk(self):
+        stream = JsonStream(io.StringIO(json.dumps(DOCUMENT)))
+        keys = []
+        for key in stream.members():
+            keys.append(key)
+            stream.value()
+        self.assertEqual(keys, list(DOCUMENT))
+
+    def test_rejects_a_truncated_document(self):
+        stream = JsonStream(io.StringIO('{"days": [1, 2'))
+        with self.assertRaises(ValueError):
+            walk(stream)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from history import IntervalIndex
+
+
+def clipped_total(intervals, t1, t2):
+    return sum(max(0.0, min(end, t2) - max(start, t1)) for start, end in intervals)
+
+
+class IntervalIndexTest(unittest.TestCase):
+    def test_range_is_clipped_at_both_ends(self):
+        index = IntervalIndex()
+        index.add(0, 1000, 2000)
+        index.add(0, 3000, 4000)
+        self.assertEqual(index.total_between(0, 1500, 3500), 1000)
+        self.assertEqual(index.total_between(0, 2000, 3000), 0)
+        self.assertEqual(index.totals_between(0, 5000), {0: 2000})
+
+    def test_overlapping_intervals(self):
+        index = IntervalIndex()
+        index.add(0, 1000, 2000)
+        index.add(0, 1600, 1700)
+        self.assertEqual(index.total_between(0, 1800, 3000), 200)
+        self.assertEqual(index.total_between(0, 1650, 3000), 400)
+
+        loaded = IntervalIndex()
+        loaded.load(0, [[1600, 1700], [1000, 2000]])
+        self.assertEqual(loaded.total_between(0, 1800, 3000), 200)
+
+    def test_matches_clipping_every_interval(self):
+        rng = random.Random(7)
+        for overlap in (False, True):
+            index = IntervalIndex()
+            intervals = []
+            position = 0.0
+            for _ in range(300):
+                if overlap:
+                    start = rng.uniform(0, 10000)
+                else:
+                    start = position = position + rng.uniform(0, 50)
+                    position += rng.uniform(0, 50)
+                end = position if not overlap else start + rng.uniform(0, 200)
+                index.add(0, start, end)
+                intervals.append((start, end))
+            for _ in range(200):
+                t1 = rng.uniform(-100, 16000)
+                t2 = t1 + rng.uniform(0, 3000)
+                self.assertAlmostEqual(index.total_between(0, t1, t2), clipped_total(intervals, t1, t2), places=6)
+
+    def test_pop_before_and_copy(self):
+        index = IntervalIndex()
+        index.add(0, 1000, 2000)
+        index.add(0, 1500, 2500)
+        index.add(0, 3000, 3500)
+        other = index.copy()
+        self.assertEqual(index.pop_before(0, 2800), [(1000, 2000), (1500, 2500)])
+        self.assertEqual(index.total_between(0, 0, 5000), 500)
+        self.assertEqual(other.total_between(0, 1800, 5000), 1400)
+        index.pop_before(0, 5000)
+        self.assertEqual(index.totals_between(0, 5000), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
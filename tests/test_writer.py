@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import storage
+from checkpoint import SessionCheckpoint
+from storage import BackgroundWriter, JournalStore
+
+SLOW_WRITE = 0.2
+MAIN_THREAD_BUDGET = 0.02
+
+
+def slow_run_write(op, fsync=True):
+    # Stand-in for a slow network drive or antivirus scan: every write blocks for a while.
+    time.sleep(SLOW_WRITE)
+    real_run_write(op, fsync)
+
+
+real_run_write = storage.run_write
+
+
+def total_seconds(history):
+    return sum(history.totals_between(0, time.time()).values())
+
+
+class WriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.directory.name, 'data.json')
+        self.journal_file = os.path.join(self.directory.name, 'journal.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def store(self, writer):
+        return JournalStore(self.data_file, self.journal_file, writer=writer)
+
+    def test_booking_does_not_wait_for_a_slow_disk(self):
+        # What start_tracking does on the main thread: stop the running session and book it.
+        with mock.patch.object(storage, 'run_write', slow_run_write):
+            writer = BackgroundWriter()
+            store = self.store(writer)
+            history = store.load()
+            latencies = []
+            start = time.time() - 3600
+            for i in range(5):
+                began = time.perf_counter()
+                history.add_interval('Werk', start + i * 60, start + i * 60 + 50)
+                store.append('Werk', start + i * 60, start + i * 60 + 50)
+                latencies.append(time.perf_counter() - began)
+            writer.close()
+
+        self.assertLess(max(latencies), MAIN_THREAD_BUDGET)
+        self.assertEqual(total_seconds(self.store(None).load()), 250)
+
+    def test_failed_snapshot_keeps_the_journal(self):
+        writer = BackgroundWriter(linger=0)
+        store = self.store(writer)
+        history = store.load()
+        start = time.time() - 3600
+        for i in range(3):
+            history.add_interval('Werk', start + i * 100, start + i * 100 + 50)
+            store.append('Werk', start + i * 100, start + i * 100 + 50)
+        store.compact(history)
+        writer.flush()
+
+        for i in range(3, 7):
+            history.add_interval('Werk', start + i * 100, start + i * 100 + 50)
+            store.append('Werk', start + i * 100, start + i * 100 + 50)
+        # A directory in the way of the temporary file makes the snapshot write fail.
+        os.mkdir(f"{self.data_file}.tmp")
+        store.compact(history)
+        for i in range(7, 11):
+            history.add_interval('Werk', start + i * 100, start + i * 100 + 50)
+            store.append('Werk', start + i * 100, start + i * 100 + 50)
+        with mock.patch('builtins.print'):
+            writer.close()
+
+        self.assertEqual(total_seconds(self.store(None).load()), 550)
+
+    def test_checkpoint_is_cleared_after_the_booking_is_written(self):
+        # What stop_tracking does: book the session, then clear its checkpoint. Until the
+        # booking is on disk the checkpoint must still hold the session.
+        checkpoint_file = os.path.join(self.directory.name, 'session.bin')
+        start = time.time() - 3600
+        with mock.patch.object(storage, 'run_write', slow_run_write):
+            writer = BackgroundWriter()
+            store = self.store(writer)
+            history = store.load()
+            checkpoint = SessionCheckpoint(checkpoint_file, writer=writer)
+            checkpoint.save('Werk', start, 50)
+            writer.flush()
+
+            history.add_interval('Werk', start, start + 50)
+            store.append('Werk', start, start + 50)
+            checkpoint.clear()
+            self.assertEqual(checkpoint.read(), ('Werk', start, 50))
+            writer.close()
+
+        self.assertEqual(total_seconds(self.store(None).load()), 50)
+        self.assertIsNone(checkpoint.read())
+
+
+if __name__ == '__main__':
+    unittest.main()